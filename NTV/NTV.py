@@ -5,6 +5,7 @@ import numpy as np
 import pyfits as pf
 import matplotlib.pyplot
 import sys
+import os
 import time
 
 #import scipy as sp
@@ -20,46 +21,40 @@ from details import Ui_Dialog
 from header_ui import Ui_header
 from threeD_ui import Ui_threeD
 from pref import Ui_prefs
+from catalog_ui import Ui_catalog
+from loader import scan_hdus,default_hdu,is_fits,is_packed,read_image,mapped_image,to_native
+from tiles import tiled_image,can_tile
+from stream import frame_stream
+from pyramid import image_pyramid
+import cache
+import stats
+import stretch
+import summed
+from catalog import header_catalog
+from colormaps import luts,lut_index
+from minimap import minimap
+from cuts import cut_view
+from timing import monitor,timed
+from qt_canvas import view_widget
 
 #This variable is purely used for internal coding practices to force a config rewrite
 Update_config = False
 
+#The most pixels across that get handed to imshow for an image that can be read a piece at a time, such as
+#a tile compressed image. Larger areas are shown decimated by the step view_step returns.
+display_pixels = 1024
+def view_step(span):
+    return max(int(np.ceil(span/float(display_pixels))),1)
+#Only the pixels in view are scaled and drawn, along with this fraction of the view on each side so small
+#pans do not need anything redone
+view_margin = 0.25
+#The summed area tables of a frame are only built once it has been shown for this many milliseconds, so stepping
+#through the frames of a cube does not start a build for each one
+summed_delay = 500
+#The readouts of the pixel under the mouse are redone at most once every this many milliseconds, about once
+#a refresh of a 60 Hz screen. The mouse moves far more often than that.
+hover_interval = 16
 
-#This function is used to scale up the side preview to the same size as the Qlabel,
-#for better viewing
-def rebin(thedata, factor,conserve=None):
-    """
-Rebins an array into an array with the same aspect ratio, but with
-dimensions that are larger or smaller by a factor of 'factor'. Increase
-or decrease of dimensions is determined by the sign of 'factor'.
-
-If the conserve keyword is set, flux is conserved, and the total of
-the output array will be equal (barring rounding errors) to the total 
-of the input array.
-
-Works for 2D arrays; would require more smarts to make it work for 
-higher dimensions. 
-    """
-    assert abs(factor) != 1.0, "Rebinning at the same scale wastes cpu!"
-
-    if factor < 0: # make the array smaller
-        oldshape=thedata.shape
-        factor=abs(factor)
-        work=np.zeros(oldshape,thedata.dtype)
-        for i in range(0,oldshape[0],factor):
-            for j in range(0,oldshape[1],factor):
-                if (conserve is None):
-                    work[i,j]=thedata[i:i+factor,j:j+factor].mean(dtype=np.float64)
-                else:
-                    work[i,j]=thedata[i:i+factor,j:j+factor].sum(dtype=np.float64)
-        return work[::factor,::factor]
-
-    elif (factor > 0): # make the array bigger
-        work= np.repeat( np.repeat(thedata, factor, axis=0), factor, axis=1)
-        if (conserve is None):
-            return work
-        else:
-            return work/(factor*factor)
 
 #These next three functions are used to fit a two dimentional Gaussian to a user defined object
 #The accuracy of this fit should only be trusted to the tenths place, but it provides a good guess.
@@ -81,6 +76,7 @@ def moments(data):
     height = data.max()
     return height, x, y, width_x, width_y
 
+@timed('fit')
 def fitgaussian(data):
     from scipy import optimize
     params = moments(data)
@@ -124,6 +120,14 @@ class pref_box(QDialog,Ui_prefs):
             self.overplot.setChecked(1)
         if self.dbox == 0:
             self.multi.setChecked(1)
+        self.memmapcheck.setChecked(self.pref.value('memmap',1).toInt()[0])
+        self.cachesizeset.setText(str(self.pref.value('cachesize',512).toInt()[0]))
+        index = self.pixeltypebox.findText(self.pref.value('pixeltype','float32').toString())
+        self.pixeltypebox.setCurrentIndex(max(index,0))
+        if self.pref.value('pyramid','mean').toString() == 'max':
+            self.pyramidbox.setCurrentIndex(1)
+        index = self.displaybox.findText(self.pref.value('display','matplotlib').toString(),Qt.MatchFixedString)
+        self.displaybox.setCurrentIndex(max(index,0))
         QObject.connect(self.ok_sync,SIGNAL('clicked()'),self.accept)
         QObject.connect(self,SIGNAL('reload'),parent.read_config)
         QObject.connect(self,SIGNAL('redraw'),parent.drawim)
@@ -144,6 +148,14 @@ class pref_box(QDialog,Ui_prefs):
             self.pref.setValue('dbox',1)
         if self.multi.isChecked():
             self.pref.setValue('dbox',0)
+        if self.memmapcheck.isChecked():
+            self.pref.setValue('memmap',1)
+        else:
+            self.pref.setValue('memmap',0)
+        self.pref.setValue('cachesize',int(self.cachesizeset.text()))
+        self.pref.setValue('pixeltype',self.pixeltypebox.currentText())
+        self.pref.setValue('pyramid',str(self.pyramidbox.currentText()).lower())
+        self.pref.setValue('display',str(self.displaybox.currentText()).lower())
         self.pref.sync()
         self.emit(SIGNAL('reload'))
         self.emit(SIGNAL('redraw'))
@@ -177,6 +189,77 @@ class header_view(QDialog,Ui_header):
             self.cardlist.addItem(temp)       
         self.exec_()
 
+class catalog_view(QDialog,Ui_catalog):
+    '''
+    The header catalog window. Scan reads the headers of every fits file under the directory into the
+    catalog on a background thread, the search box is run against the catalog as it is typed, and double
+    clicking a match shows it in the viewer.
+    '''
+    def __init__(self,viewer):
+        super(catalog_view,self).__init__(viewer)
+        self.setupUi(self)
+        self.viewer = viewer
+        self.catalog = header_catalog()
+        self.scanner = None
+        self.folderset.setText(os.getcwd())
+        QObject.connect(self.browsebutton,SIGNAL('clicked()'),self.browse)
+        QObject.connect(self.scanbutton,SIGNAL('clicked()'),self.scan)
+        QObject.connect(self.queryset,SIGNAL('textChanged(QString)'),self.search)
+        QObject.connect(self.resultlist,SIGNAL('itemDoubleClicked(QListWidgetItem*)'),self.openmatch)
+        self.statuslabel.setText('%d files in the catalog' % self.catalog.count())
+        self.show()
+    def browse(self):
+        folder = str(QFileDialog.getExistingDirectory(self,'Select Directory to Catalog',self.folderset.text()))
+        if folder != '':
+            self.folderset.setText(folder)
+    def scan(self):
+        '''
+        Starts scanning the directory, or stops a scan that is running
+        '''
+        if self.scanner != None:
+            self.scanner.cancel()
+            return
+        self.scanner = catalogThread(str(self.folderset.text()),self)
+        QObject.connect(self.scanner,SIGNAL('progress'),self.scanprogress)
+        QObject.connect(self.scanner,SIGNAL('scanned'),self.scanned)
+        self.scanbutton.setText('Stop')
+        self.statuslabel.setText('Looking for files')
+        self.scanner.start()
+    def scanprogress(self,done,total):
+        self.statuslabel.setText('Read %d of %d headers' % (done,total))
+    def scanned(self,scanner):
+        if scanner is not self.scanner:
+            return
+        self.scanner = None
+        self.scanbutton.setText('Scan')
+        if scanner.error != None:
+            self.statuslabel.setText('<font color=red>'+scanner.error+'</font>')
+            return
+        self.search()
+        self.statuslabel.setText('Read %d headers, %d files in the catalog. ' % (scanner.done,self.catalog.count())+str(self.statuslabel.text()))
+    def search(self,text=None):
+        '''
+        Lists the files that match what is in the search box
+        '''
+        self.resultlist.clear()
+        text = str(self.queryset.text())
+        if text.strip() == '':
+            self.statuslabel.setText('')
+            return
+        try:
+            matches = self.catalog.query(text)
+        except ValueError, e:
+            self.statuslabel.setText('<font color=red>'+str(e)+'</font>')
+            return
+        self.resultlist.addItems(matches)
+        self.statuslabel.setText('%d matches' % len(matches))
+    def openmatch(self,item):
+        self.viewer.showfile(str(item.text()))
+    def closeEvent(self,event):
+        if self.scanner != None:
+            self.scanner.cancel()
+        event.accept()
+
 #This class implements the dialog box to display information on a particular object that a user
 #defines by clicking on it.
 class details_view(QDialog,Ui_Dialog):
@@ -187,6 +270,13 @@ class details_view(QDialog,Ui_Dialog):
     def __init__(self,frame,frameedit,realx,realy,apsize,clipmax,clipmin,color,parent=None):
         super(details_view,self).__init__(parent)
         self.setupUi(self)
+        #the spread of the background, over the same annulus as its median, goes under the background
+        self.label_9 = QLabel('Background Sigma',self)
+        self.gridLayout.addWidget(self.label_9,4,0,1,1)
+        self.bsigma = QLabel(self)
+        self.bsigma.setFrameShape(QFrame.StyledPanel)
+        self.bsigma.setFrameShadow(QFrame.Sunken)
+        self.gridLayout.addWidget(self.bsigma,4,1,1,1)
         #set the inputs to class members and initialize some variables needed in plotting
         self.frame = frame
         self.framey,self.framex = self.frame.shape
@@ -237,8 +327,16 @@ class details_view(QDialog,Ui_Dialog):
         #This thread is a hack to get the canvas to redraw properly on the first draw. futures redraws are handled by the draw_cancas itself.
         self.temp = myThread2(parent=self)
         self.temp.start()
-        self.horcut.canvas.ax.plot(self.frame[maxy,:],'.')
-        self.vertcut.canvas.ax.plot(self.frame[:,maxx],'.')
+        if isinstance(self.frame,np.ndarray):
+            self.horcut.canvas.ax.plot(self.frame[maxy,:],'.')
+            self.vertcut.canvas.ax.plot(self.frame[:,maxx],'.')
+        else:
+            #a full column of an image that is read a piece at a time means reading all of it, so only
+            #cut through the area around the star
+            ylo,yhi = max(maxy-display_pixels/2,0),min(maxy+display_pixels/2,self.framey)
+            xlo,xhi = max(maxx-display_pixels/2,0),min(maxx+display_pixels/2,self.framex)
+            self.horcut.canvas.ax.plot(np.arange(xlo,xhi),self.frame[maxy,xlo:xhi],'.')
+            self.vertcut.canvas.ax.plot(np.arange(ylo,yhi),self.frame[ylo:yhi,maxx],'.')
         self.show()
     def limit_check(self):
         '''
@@ -274,6 +372,7 @@ class details_view(QDialog,Ui_Dialog):
         self.vis.canvas.format_labels()
         self.draw_canvas()
         
+    @timed('details')
     def draw_canvas(self):
         #Creating the new view based on the correct positions. This is the view the radial profile will be
         #generated from
@@ -290,10 +389,12 @@ class details_view(QDialog,Ui_Dialog):
         self.radprof.canvas.ax.plot(self.dist.flatten(),self.view.flatten(),'k.')
         #sum up the photons in anulus
         self.photons = np.sum(self.view[np.where(self.dist<self.apsize)])
-        #get median backkground lvl
-        self.bphotons = np.median(self.view[np.where(np.bitwise_and(self.dist>self.radin,self.dist<self.radout))])
+        #get median backkground lvl, and the spread of the same pixels
+        annulus = self.view[np.where(np.bitwise_and(self.dist>self.radin,self.dist<self.radout))]
+        self.bphotons = np.median(annulus)
         #update text and background
         self.background.setText(str(self.bphotons))
+        self.bsigma.setText(str(np.std(annulus)))
         self.photons -= len(np.where(self.dist<self.apsize))*self.bphotons
         self.counts.setText(str(self.photons))
         #Draw the interactive lines
@@ -410,9 +511,20 @@ class NTV(QMainWindow,Ui_NTV):
         self.pipe = pipe
         self.pipesave = pipe
         
+        #the main view is painted by qt rather than matplotlib if that was picked in the preferences
+        if self.display != 'matplotlib':
+            self.gridLayout_2.removeWidget(self.imshow)
+            self.imshow.deleteLater()
+            self.imshow = view_widget(self.centy,opengl=self.display=='opengl')
+            self.imshow.setMinimumSize(QSize(450,450))
+            self.imshow.setObjectName("imshow")
+            self.gridLayout_2.addWidget(self.imshow,0,1,1,1)
+        
         #start by hiding the x and y views of the image
         self.ygview.hide()
         self.xgview.hide()
+        self.ycut = cut_view(self.ygview,vertical=True)
+        self.xcut = cut_view(self.xgview)
         
         #This will accelerate the drawing of the canvas if qtopengl is available in pyqt
         if hasopengl == 1:
@@ -422,12 +534,46 @@ class NTV(QMainWindow,Ui_NTV):
         
         #Constants used by program, funloaded gets set to 1 when there is a file loaded, provides a check for manipulating functions
         #cid is to initialize a check of weather the pic star
-        #button has been clicked yet or not. homeImage is used to tell draw image when a new image is being loaded. 
+        #button has been clicked yet or not. imdata is the image artist on the imshow canvas, made on the first draw.
         self.funloaded = 0
         self.cid = None
         self.head = None
         self.imagecube = None
-        self.homeImage = 0
+        self.hdulist = None
+        self.loader = None
+        self.entry = None
+        self.framenum = None
+        self.editbox = None
+        self.arraycount = 0
+        self.editstats = None
+        self.quantized = None
+        self.viewpending = False
+        self.clippending = False
+        self.hoverevent = None
+        self.hoverlast = 0.
+        self.hduindex = []
+        self.hdu = None
+        self.followdir = None
+        self.watcher = None
+        self.followtimer = None
+        self.followsoon = None
+        self.imdata = None
+        self.colorwork = None
+        self.drawnlims = None
+        #draws the side preview of the pixels around the mouse
+        self.minimap = minimap(self.minipix)
+        self.pyramid = None
+        self.pyramider = None
+        #box statistics of the image, from summed area tables once they are built
+        self.boxes = None
+        self.summer = None
+        #works out the statistics of all of a memory mapped image once it is shown
+        self.statser = None
+        #waits for the frame to settle before the tables are built
+        self.summedsoon = QTimer(self)
+        self.summedsoon.setSingleShot(True)
+        self.summedsoon.setInterval(summed_delay)
+        QObject.connect(self.summedsoon,SIGNAL('timeout()'),self.startsummed)
         
         #Set some UI elements
         
@@ -438,10 +584,75 @@ class NTV(QMainWindow,Ui_NTV):
         #set ui element
         self.filelab.setText("<font color=red>Load File</font>")
         
+        #Directory follow mode is turned on and off from the file menu
+        self.actionFollow = QAction('Follow Directory',self)
+        self.actionFollow.setCheckable(True)
+        self.menuFile.insertAction(self.actionPreferences,self.actionFollow)
+        self.actionCatalog = QAction('Header Catalog',self)
+        self.menuFile.insertAction(self.actionPreferences,self.actionCatalog)
+        self.catalog_window = None
+        
+        #The latency overlay sits on the top left of the main view, with a shorter version in the status bar.
+        #Both are refreshed from a timer that only runs while the overlay is on.
+        self.actionTiming = QAction('Latency Overlay',self)
+        self.actionTiming.setCheckable(True)
+        self.menuImage.addAction(self.actionTiming)
+        self.timinglabel = QLabel(self.imshow)
+        self.timinglabel.setStyleSheet('background-color: rgba(0,0,0,160); color: white; font-family: monospace; padding: 4px')
+        self.timinglabel.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.timinglabel.move(12,12)
+        self.timinglabel.hide()
+        self.timingstatus = QLabel(self)
+        self.statusbar.addPermanentWidget(self.timingstatus)
+        self.timingstatus.hide()
+        self.timingtimer = QTimer(self)
+        
+        #The mean and standard deviation of the box of pixels around the mouse, as big as the cut size, go under
+        #the other readouts
+        self.boxrows = []
+        for row,text in ((5,'Box Mean'),(6,'Box Sigma')):
+            label = QLabel(text,self.frame)
+            value = QLabel(self.frame)
+            value.setMaximumSize(QSize(140,40))
+            value.setFrameShape(QFrame.StyledPanel)
+            value.setFrameShadow(QFrame.Sunken)
+            self.gridLayout.addWidget(label,row,0,1,1)
+            self.gridLayout.addWidget(value,row,1,1,1)
+            self.boxrows.append(value)
+        self.boxmean,self.boxsigma = self.boxrows
+        
+        #The extension selector for multi extension files, it sits in the otherwise empty bottom layout
+        self.hdulabel = QLabel('Extension',self.centy)
+        self.hdubox = QComboBox(self.centy)
+        self.hdubox.setSizeAdjustPolicy(QComboBox.AdjustToContents)
+        self.hdubox.setEnabled(False)
+        self.horizontalLayout_4.addWidget(self.hdulabel)
+        self.horizontalLayout_4.addWidget(self.hdubox)
+        self.horizontalLayout_4.addStretch()
+        
+        #The stretches past linear and log get their radio buttons here, in a second row under the two from the ui file
+        self.stretchbuttons = [('linear',self.lincheck),('log',self.logcheck)]
+        self.stretchrow = QHBoxLayout()
+        for name in stretch.names[2:]:
+            button = QRadioButton(stretch.labels[name],self.frame)
+            if len(self.stretchbuttons) < 3:
+                self.horizontalLayout_3.addWidget(button)
+            else:
+                self.stretchrow.addWidget(button)
+            self.stretchbuttons.append((name,button))
+        for i in range(self.verticalLayout.count()):
+            if self.verticalLayout.itemAt(i).layout() is self.horizontalLayout_3:
+                self.verticalLayout.insertLayout(i+1,self.stretchrow)
+                break
+        self.stretchgroup = QButtonGroup(self)
+        for i in range(len(self.stretchbuttons)):
+            self.stretchgroup.addButton(self.stretchbuttons[i][1],i)
+        
         #populate the colormap drop down box with available color maps
         self.cmaplist = matplotlib.cm.datad.keys()
         self.cmapbox.insertItems(0, self.cmaplist)
         self.cmapbox.setCurrentIndex(self.cmaplist.index('gray'))
+        luts.build(self.cmaplist)
         
         
         #Checks to see if a pipe was passes, ie if the program is being used in embeded mode, if so, starts the thread that will listen to the pipe
@@ -451,30 +662,71 @@ class NTV(QMainWindow,Ui_NTV):
         
         #These connect each of the UI elements with their associated action
         QObject.connect(self.cmapbox,SIGNAL('activated(int)'),self.cmapupdate)
-        QObject.connect(self.clipslide,SIGNAL('sliderReleased()'),self.sliderupdate)
-        self.imshow.canvas.fig.canvas.mpl_connect('motion_notify_event',self.mouseplace)
-        QObject.connect(self.lincheck,SIGNAL('toggled(bool)'),self.scale)
-        QObject.connect(self.logcheck,SIGNAL('toggled(bool)'),self.scale)
+        #the slider picks the percentile of the pixels the colors top out at, and redraws as it is dragged
+        self.clipslide.setRange(0,100*stats.percentile_steps)
+        self.clipslide.setToolTip('Clip at this percentile of the pixels')
+        QObject.connect(self.clipslide,SIGNAL('valueChanged(int)'),self.sliderupdate)
+        self.imshow.canvas.mpl_connect('motion_notify_event',self.mousemoved)
+        self.imshow.canvas.mpl_connect('draw_event',self.canvasdrawn)
+        #the image artist is kept between draws, so the limits are only ever set by homeview and the toolbar
+        self.imshow.canvas.ax.set_autoscale_on(False)
+        self.imshow.canvas.ax.callbacks.connect('xlim_changed',self.viewchanged)
+        self.imshow.canvas.ax.callbacks.connect('ylim_changed',self.viewchanged)
+        QObject.connect(self.stretchgroup,SIGNAL('buttonClicked(int)'),self.stretchchanged)
         QObject.connect(self.actionOpen,SIGNAL('triggered()'),self.open)
         QObject.connect(self.actionHeader_2,SIGNAL('triggered()'),self.header)
         QObject.connect(self.actionAbout,SIGNAL('triggered()'),self.about)
         QObject.connect(self.actionQuit,SIGNAL('triggered()'),self.close)
         QObject.connect(self.actionPreferences,SIGNAL('triggered()'),self.prefer)
+        QObject.connect(self.actionFollow,SIGNAL('triggered(bool)'),self.followmenu)
+        QObject.connect(self.actionCatalog,SIGNAL('triggered()'),self.catalog)
+        QObject.connect(self.actionTiming,SIGNAL('triggered(bool)'),self.timingmenu)
+        QObject.connect(self.timingtimer,SIGNAL('timeout()'),self.showtiming)
+        self.actionTiming.setChecked(monitor.enabled)
+        self.timingmenu(monitor.enabled)
         QObject.connect(self.pushButton,SIGNAL('clicked()'),self.getclick)
         QObject.connect(self.ycheckbox,SIGNAL('toggled(bool)'),self.showy)
         QObject.connect(self.xcheckbox,SIGNAL('toggled(bool)'),self.showx)
+        QObject.connect(self.hdubox,SIGNAL('activated(int)'),self.change_hdu)
+        #page up and down step through the extensions, for walking through the ccds of an exposure
+        QShortcut(QKeySequence(Qt.Key_PageDown),self,self.next_hdu)
+        QShortcut(QKeySequence(Qt.Key_PageUp),self,self.prev_hdu)
         
-        #fuctions for minimap scaling
-        self.lin = lambda x,max,min: (255/(max-min))*x-(255*max/(max-min))+255
-        self.func = self.lin
-
         #This checks for files loaded with the program from the command line
         if file != None:
-            if file.find('fits') != -1 or file.find('FIT')!=-1:
+            if os.path.isdir(file):
+                #given a directory, show each new file that lands in it
+                self.follow(file)
+            elif is_fits(file):
                 self.path = file
                 self.loadinfo()
             else:
                 self.filelab.setText('<font color=red>Invalid Format</font>')
+    def timingmenu(self,on):
+        '''
+        Turns the latency overlay on or off, starting the timings over when it is turned on
+        '''
+        monitor.enabled = on
+        if on:
+            monitor.reset()
+            self.timingtimer.start(500)
+            self.showtiming()
+            self.timinglabel.show()
+            self.timinglabel.raise_()
+            self.timingstatus.show()
+        else:
+            self.timingtimer.stop()
+            self.timinglabel.hide()
+            self.timingstatus.hide()
+    
+    def showtiming(self):
+        lines = monitor.report()
+        if len(lines) == 0:
+            lines = ['No timings yet']
+        self.timinglabel.setText('\n'.join(lines))
+        self.timinglabel.adjustSize()
+        self.timingstatus.setText(monitor.summary())
+    
     def showy(self):
         '''
         This function toggles the y virtical view around the cursor
@@ -517,6 +769,11 @@ class NTV(QMainWindow,Ui_NTV):
         self.settings.setValue('cutsize',3)
         self.settings.setValue('origin','upper')
         self.settings.setValue('dbox',0)
+        self.settings.setValue('memmap',1)
+        self.settings.setValue('cachesize',512)
+        self.settings.setValue('pixeltype','float32')
+        self.settings.setValue('pyramid','mean')
+        self.settings.setValue('display','matplotlib')
         self.settings.setValue('has_config',1)
         self.settings.sync()
     def read_config(self):
@@ -530,6 +787,34 @@ class NTV(QMainWindow,Ui_NTV):
         self.cutrad = self.settings.value('cutsize').toInt()[0]
         self.orig = self.settings.value('origin').toString()
         self.dboxplot = self.settings.value('dbox').toInt()[0]
+        #config files written before memmap was an option will not have the key, so default it on
+        self.memmap = self.settings.value('memmap',1).toInt()[0]
+        #the budget of the cache of recently opened images, in megabytes
+        self.cachesize = self.settings.value('cachesize',512).toInt()[0]
+        cache.image_cache.resize(self.cachesize*1024**2)
+        #scaled views of frames and their summed area tables get a quarter of that again each, and the statistics
+        #of frames an eighth
+        cache.scaled_cache.resize(self.cachesize*1024**2/4)
+        cache.summed_cache.resize(self.cachesize*1024**2/4)
+        cache.stats_cache.resize(self.cachesize*1024**2/8)
+        #the type pixel data is converted to when it is read in, None keeps it as pyfits hands it back
+        pixeltype = str(self.settings.value('pixeltype','float32').toString())
+        if pixeltype == 'As Stored':
+            pixeltype = None
+        if hasattr(self,'pixeltype') and pixeltype != self.pixeltype:
+            #images already in the cache were read in as the old type
+            cache.image_cache.clear()
+            cache.scaled_cache.clear()
+            cache.summed_cache.clear()
+            cache.stats_cache.clear()
+        self.pixeltype = pixeltype
+        #how pixels are combined in the zoomed out levels of large images, mean or max
+        self.pyramidmethod = str(self.settings.value('pyramid','mean').toString())
+        if getattr(self,'pyramid',None) != None and self.pyramid.method != self.pyramidmethod:
+            self.buildpyramid()
+        #what paints the main view, matplotlib, qimage or opengl. it is only read when NTV starts
+        if not hasattr(self,'display'):
+            self.display = str(self.settings.value('display','matplotlib').toString())
         self.sizeofcut.setText(str(self.cutrad))
     def check_preview(self):
         '''
@@ -544,7 +829,21 @@ class NTV(QMainWindow,Ui_NTV):
         changes which image in a data cube is bing drawn. Updated from 3dviewr
         '''
         self.image = self.imagecube[newnum]
+        self.framenum = newnum
+        self.buildsummed()
         self.scale()
+    def change_hdu(self,num):
+        '''
+        Switches to another extension of the open file. Only the selected hdu is read, the headers were
+        already scanned when the file was opened.
+        '''
+        if self.funloaded == 1 and num >= 0 and num < len(self.hduindex):
+            self.hdubox.setCurrentIndex(num)
+            self.loadinfo(hdu=self.hduindex[num].index)
+    def next_hdu(self):
+        self.change_hdu(self.hdubox.currentIndex()+1)
+    def prev_hdu(self):
+        self.change_hdu(self.hdubox.currentIndex()-1)
     def header(self):
         '''
         This function serves to create a header_view instance to show the header information in a dialog box
@@ -556,11 +855,16 @@ class NTV(QMainWindow,Ui_NTV):
         '''
         This is the fucntion that is used to update the image variable of the class if the program is used in embeded mode, and an array is passed to the pipe.
         '''
+        #the array is converted once here rather than every numpy call paying for its type later
+        if self.pixeltype != None:
+            array = to_native(array,self.pixeltype)
         #Load the data into a cube and set the image to the first entry, if it is a threed cube
         if len(array.shape) == 3:
             #this will close a pre existing window if one is open.
             if self.imagecube != None:
                 self.threed_win.close()
+            #a cube streamed from a file is closed if the cache has let go of it too
+            cache.show(None,self.imagecube)
             self.image = array[0]
             self.imagecube = array
         else:
@@ -575,8 +879,8 @@ class NTV(QMainWindow,Ui_NTV):
         if self.funloaded == 1:
             #This if statement is a check to make sure to clear if the pick star box was clicked more than once
             if self.cid != None:
-                self.imshow.canvas.fig.canvas.mpl_disconnect(self.cid)
-            self.cid = self.imshow.canvas.fig.canvas.mpl_connect('button_press_event',self.drawbox)
+                self.imshow.canvas.mpl_disconnect(self.cid)
+            self.cid = self.imshow.canvas.mpl_connect('button_press_event',self.drawbox)
             
         
     def drawbox(self,event):
@@ -586,11 +890,17 @@ class NTV(QMainWindow,Ui_NTV):
         if self.funloaded == 1:
             #get aperature size from size of cut widget
             cutv = int(self.sizeofcut.text())
+            #the details view needs the scaled frame at full resolution, if only part of it is scaled
+            #hand it something that scales the pieces it asks for
+            if self.editbox == (0,self.image.shape[0],0,self.image.shape[1],1):
+                frameedit = self.imageedit
+            else:
+                frameedit = scaled_image(self.image,self.scaledata)
 
             #create an instance of details_view class. The if statement is to check and see if the box should be overplotted or not
             if self.dboxplot == 0:
                 print "lots"
-                details_view(self.image,self.imageedit,event.xdata,event.ydata,cutv,self.mx,self.imageedit.min(),self.z)
+                details_view(self.image,frameedit,event.xdata,event.ydata,cutv,self.mx,self.editstats.min,self.z)
             if self.dboxplot == 1:
                 #Try statement is to catch if there is not a window open already
                 try:
@@ -601,14 +911,14 @@ class NTV(QMainWindow,Ui_NTV):
                 except:
                     pass
                 #Create the window to keep track of details view
-                self.details_box = details_view(self.image,self.imageedit,event.xdata,event.ydata,cutv,self.mx,self.imageedit.min(),self.z)
+                self.details_box = details_view(self.image,frameedit,event.xdata,event.ydata,cutv,self.mx,self.editstats.min,self.z)
                 try:
                     #Try and reset the geometry, try is used to catch if the window is not open
                     self.details_box.setGeometry(self.detail_geometry)
                 except:
                     pass
             #disconnect the canvas from clicks, so that it can still be used for functions such as zooming etc.
-            self.imshow.canvas.fig.canvas.mpl_disconnect(self.cid)
+            self.imshow.canvas.mpl_disconnect(self.cid)
 
     def open(self):
         '''
@@ -621,12 +931,140 @@ class NTV(QMainWindow,Ui_NTV):
             file = str(QFileDialog.getOpenFileName(self,'Select Files to Process','~/'))
         except:
             pass
-        if file.find('fits') != -1 or file.find('FIT')!=-1:
+        if is_fits(file):
             self.path = file
             self.loadinfo()
         else:
             self.filelab.setText('<font color=red>Invalid Format</font>')
     
+    def catalog(self):
+        '''
+        Shows the header catalog window, there is only ever one of them
+        '''
+        if self.catalog_window == None:
+            self.catalog_window = catalog_view(self)
+        self.catalog_window.show()
+        self.catalog_window.raise_()
+    
+    def followmenu(self,checked):
+        '''
+        Turns directory follow mode on or off from the file menu, asking for the directory to follow
+        '''
+        if checked:
+            folder = str(QFileDialog.getExistingDirectory(self,'Select Directory to Follow','~/'))
+            if folder == '':
+                self.actionFollow.setChecked(False)
+                return
+            self.follow(folder)
+        else:
+            self.unfollow()
+    
+    def follow(self,folder):
+        '''
+        Watches a directory and shows each new fits file that lands in it. A new file is read on a loadThread as
+        soon as it has stopped growing, and shown the moment it is ready. If a newer file shows up while one is
+        still being read, the older one is dropped. The newest file already in the directory is shown right away.
+        '''
+        self.unfollow()
+        self.followdir = folder
+        self.followsizes = {}
+        self.followseen = set(self.fitsfiles(folder))
+        self.watcher = QFileSystemWatcher([folder],self)
+        QObject.connect(self.watcher,SIGNAL('directoryChanged(const QString&)'),self.followscan)
+        #network file systems do not always report changes, so the directory gets polled as well
+        self.followtimer = QTimer(self)
+        QObject.connect(self.followtimer,SIGNAL('timeout()'),self.followscan)
+        #while files are growing the directory is looked at again sooner, from one timer that is restarted
+        #rather than a new one for every look
+        self.followsoon = QTimer(self)
+        self.followsoon.setSingleShot(True)
+        self.followsoon.setInterval(250)
+        QObject.connect(self.followsoon,SIGNAL('timeout()'),self.followscan)
+        self.followtimer.start(1000)
+        self.actionFollow.setChecked(True)
+        self.statusbar.showMessage('Following '+folder,5000)
+        newest = self.newestfile(self.followseen)
+        if newest != None:
+            self.showfile(newest)
+    
+    def unfollow(self):
+        '''
+        Stops following a directory
+        '''
+        if self.followdir != None:
+            self.followtimer.stop()
+            self.followsoon.stop()
+            self.watcher.removePath(self.followdir)
+            self.followtimer = None
+            self.followsoon = None
+            self.watcher = None
+            self.followdir = None
+        self.actionFollow.setChecked(False)
+    
+    def fitsfiles(self,folder):
+        '''
+        Lists the fits files in a directory
+        '''
+        try:
+            names = os.listdir(folder)
+        except OSError:
+            return []
+        return [os.path.join(folder,name) for name in names if is_fits(name)]
+    
+    def followscan(self,*args):
+        '''
+        Looks for new files in the directory being followed. A file is only read once its size is the same two
+        looks in a row, so files that are still being written are left alone until they are done.
+        '''
+        if self.followdir == None:
+            return
+        ready = []
+        sizes = {}
+        for path in self.fitsfiles(self.followdir):
+            if path in self.followseen:
+                continue
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            if size > 0 and self.followsizes.get(path) == size:
+                ready.append(path)
+                self.followseen.add(path)
+            else:
+                sizes[path] = size
+        self.followsizes = sizes
+        #look again soon rather than waiting on the poll for files that are still growing
+        if len(self.followsizes) > 0:
+            self.followsoon.start()
+        newest = self.newestfile(ready)
+        if newest != None:
+            self.showfile(newest)
+    
+    def newestfile(self,paths):
+        '''
+        The most recently modified of paths, or None if there are none. Files that are removed while this looks
+        at them are passed over.
+        '''
+        newest = None
+        newesttime = None
+        for path in paths:
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                continue
+            if newesttime == None or mtime > newesttime:
+                newest = path
+                newesttime = mtime
+        return newest
+    
+    def showfile(self,path):
+        '''
+        Loads and shows a file
+        '''
+        self.pipe = None
+        self.path = path
+        self.loadinfo()
+    
     def lbDragEnterEvent(self, event):
         '''
         updates the mouse for drop events. Should be updated in the future for proper handeling of file detection
@@ -634,18 +1072,37 @@ class NTV(QMainWindow,Ui_NTV):
         event.accept()
     def lbDropEvent(self, event):
         '''
-        Gets a file that was dropped to the program, checks for compatability and up dates the image accordinly. TO DO: change file
-        checking to its own separate function to call, was not an issue orrigionally
+        Gets a file that was dropped to the program, checks for compatability and up dates the image accordinly.
         '''
         link=event.mimeData().urls()
         file = str(link[0].toLocalFile())
-        if file.find('fits') != -1 or file.find('FIT')!=-1:
+        if is_fits(file):
             self.path = file
             self.loadinfo()
         else:
             #set error message
             self.filelab.setText('<font color=red>Invalid Format</font>')
    
+    def mousemoved(self,event):
+        '''
+        Keeps the latest position of the mouse over the image, and has mouseplace update the readouts with it at the
+        next refresh of the screen. Moves in between only replace the position, so the readouts never fall behind.
+        '''
+        if self.hoverevent == None:
+            wait = hover_interval-(time.time()-self.hoverlast)*1000
+            QTimer.singleShot(max(int(wait),0),self.hoverupdate)
+        else:
+            monitor.count('hover coalesced')
+        self.hoverevent = event
+    
+    def hoverupdate(self):
+        event = self.hoverevent
+        self.hoverevent = None
+        self.hoverlast = time.time()
+        if event != None:
+            self.mouseplace(event)
+    
+    @timed('mouseplace')
     def mouseplace(self,event):
         '''
         Handels the mouse motion over the imshow mpl canvas object. To Do, updated color map correctly. This function now  also
@@ -653,149 +1110,354 @@ class NTV(QMainWindow,Ui_NTV):
         '''
         #checks to see if the data has been loaded
         if self.funloaded == 1:
-            #makes sure the mouse is on the data canvas
-            if event.ydata != None and event.xdata != None:
-                #This next bit is to handle the preview problem at the boundary. it will create the preview based
-                #on mouse position, and boundary value if you get close to boundary.
-                ystart = event.ydata-self.previewsize
-                ystop  = event.ydata+self.previewsize
-                xstart = event.xdata-self.previewsize
-                xstop  = event.xdata+self.previewsize
-                ydif = 0
-                xdif = 0
-                if event.ydata<self.previewsize:
-                    ystart = 0
-                    ystop = self.previewsize*2
-                    ydif = self.previewsize-event.ydata
-                if event.ydata>self.image.shape[0]-1-self.previewsize:
-                    ystart = self.image.shape[0]-1-self.previewsize*2
-                    ystop = self.image.shape[0]-1
-                    ydif = (self.image.shape[0]-1-event.ydata)-self.previewsize
-                if event.xdata<self.previewsize:
-                    xstart = 0
-                    xstop  = self.previewsize*2
-                    xdif = self.previewsize-event.xdata
-                if event.xdata>self.image.shape[1]-1-self.previewsize:
-                    xstart = self.image.shape[1]-1-self.previewsize*2
-                    xstop  = self.image.shape[1]-1
-                    xdif = (self.image.shape[1]-1-event.xdata)-self.previewsize
-                if np.abs(ydif) > self.previewsize-3:
-                    ydif = self.previewsize-3
-                    if ydif <0:
-                        ydif = -1*ydif
-                if np.abs(xdif) > self.previewsize-3:
-                    ydif = self.previewsize-3
-                    if xdif <0:
-                        xdif = -1*xdif
-                if self.orig == 'upper':
-                    self.impix = self.imageedit[ystart:ystop,xstart:xstop].copy()
-                else:
-                    self.impix = self.imageedit[ystart:ystop,xstart:xstop][::-1].copy()
-                #This next few lines is to simply set the values of several pixels to white in order to draw a cross hair
-                self.impix[self.previewsize-2-ydif,self.previewsize-xdif] = 255
-                self.impix[self.previewsize-1-ydif,self.previewsize-xdif] = 255
-                self.impix[self.previewsize+1-ydif,self.previewsize-xdif] = 255
-                self.impix[self.previewsize+2-ydif,self.previewsize-xdif] = 255
-                self.impix[self.previewsize-ydif,self.previewsize-2-xdif] = 255
-                self.impix[self.previewsize-ydif,self.previewsize-1-xdif] = 255
-                self.impix[self.previewsize-ydif,self.previewsize+1-xdif] = 255
-                self.impix[self.previewsize-ydif,self.previewsize+2-xdif] = 255
-                #This rebins the numpy array larger so that it will better be a preview and will fit the QLabel
-                self.impix = rebin(self.impix,self.rebinfactor)
-                #This next bit is to convert the numpy array into something that can be displayed as a pixmap, It needs to be updated to
-                #applying the colormap!
-                self.impix = self.func(self.impix,self.mx,self.imageedit.min())
-                self.impix[np.where(self.impix>255)] = 255
-                gray = np.require(self.impix, np.uint8, 'C')
-                h, w = gray.shape
-                result = QImage(gray.data, w, h, QImage.Format_Indexed8)
-                result.ndarray = gray
-                #COLORTABLE = [~((i + (i<<8) + (i<<16))) for i in range(255,-1,-1)]
-                for i in range(256):
-                    result.setColor(i, QColor(i, i, i).rgb())
-                #result.setColorTable(COLORTABLE)
-                self.minipix.setPixmap(QPixmap(result))
+            #makes sure the mouse is on the data canvas, and on the image. A move is handled a little after it happens,
+            #by which time another image or frame may have been swapped in, so it can be past the edge of this one.
+            ny,nx = self.image.shape
+            if event.ydata != None and event.xdata != None and 0 <= event.ydata+0.5 < ny and 0 <= event.xdata+0.5 < nx:
+                #The minimap is drawn into buffers it keeps, so only the indexes of the cutout are worked out each move.
+                #Near the boundary the cutout stops at the edge and the crosshair moves off the centre.
+                self.minimap.setup(self.previewsize,self.rebinfactor)
+                y0,y1,x0,x1 = self.minimap.window(event.ydata,event.xdata,self.image.shape)
+                self.minimap.draw(self.editcut(y0,y1,x0,x1),self.editstats.min,self.mx,self.ctext,self.orig != 'upper')
                 self.pixval.setText(str(self.image[event.ydata,event.xdata]))
+                if self.boxes != None:
+                    count,total,mean,variance = self.boxes.around(event.ydata,event.xdata,self.cutrad)
+                    self.boxmean.setText('%.6g' % mean)
+                    self.boxsigma.setText('%.6g' % np.sqrt(variance))
                 
-                #this next part is to mess with the y cut view
-                if self.ycheckbox.isChecked():
-                                #delete previous scene if there
-                                try:
-                                    del self.sceney
-                                except:
-                                    pass
-                                self.sceney = QGraphicsScene()
-                                #set to viewing every other pixel if in full frame
-                                if self.imshow.canvas.ax.get_ylim()[0] -self.imshow.canvas.ax.get_ylim()[1] == self.imageedit.shape[0]:
-                                    self.ybarheights = self.imageedit[::2,event.xdata]
-                                    self.ybaroffset=0
-                                else:
-                                    self.ybarheights = self.imageedit[int(self.imshow.canvas.ax.get_ylim()[1]):int(self.imshow.canvas.ax.get_ylim()[0]),event.xdata]
-                                    self.ybaroffset=2
-                                for index in np.arange(len(self.ybarheights)):
-                                    self.sceney.addRect(0,index+index*self.ybaroffset,self.ybarheights[index]*(self.ygview.size().width()/self.ybarheights.max()),self.ybaroffset)                                
-                                maxy = QGraphicsTextItem("Maxium: "+str(self.ybarheights.max()))
-                                maxy.setPos(self.ybarheights.max()*(self.ygview.size().width()/self.ybarheights.max()),index+index*self.ybaroffset+10)
-                                maxy.rotate(90)
-                                self.sceney.addItem(maxy)
-                                medy = QGraphicsTextItem("Median: "+str(np.median(self.ybarheights)))
-                                medy.setPos(np.median(self.ybarheights)*(self.ygview.size().width()/self.ybarheights.max()),index+index*self.ybaroffset+10)
-                                medy.rotate(90)
-                                self.sceney.addItem(medy)
-                                
-                                self.ygview.setScene(self.sceney)
-                                self.ygview.fitInView(0.,0.,self.ygview.size().width(),self.ygview.size().height())
-                if self.xcheckbox.isChecked():
-                                #delete previous scene if there
-                                try:
-                                    del self.scenex
-                                    del maxy,medy,maxx,medx
-                                except:
-                                    pass
-                                self.scenex = QGraphicsScene()
-                                #set to viewing every other pixel if in full frame
-
-                                if self.imshow.canvas.ax.get_xlim()[1] -self.imshow.canvas.ax.get_xlim()[0] == self.imageedit.shape[1]:
-                                    self.xbarheights = self.imageedit[event.ydata,::2]
-                                    self.xbaroffset=0
-                                    
-                                else:
-                                    self.xbarheights = self.imageedit[event.ydata,int(self.imshow.canvas.ax.get_xlim()[0]):int(self.imshow.canvas.ax.get_xlim()[1])]
-                                    self.xbaroffset=2
-                                for indexx in np.arange(len(self.xbarheights)):
-                                    self.scenex.addRect(indexx+indexx*self.xbaroffset,0,self.xbaroffset,-1*self.xbarheights[indexx]*(self.xgview.size().height()/self.xbarheights.max()))                                
-                                maxx = QGraphicsTextItem("Maxium: "+str(self.xbarheights.max()))
-                                maxx.setPos(indexx+indexx*self.xbaroffset+10,-1*self.xbarheights.max()*(self.xgview.size().height()/self.xbarheights.max()))
-                                self.scenex.addItem(maxx)
-                                medx = QGraphicsTextItem("Median: "+str(np.median(self.xbarheights)))
-                                medx.setPos(indexx+indexx*self.xbaroffset+10,-1*np.median(self.xbarheights)*(self.xgview.size().height()/self.xbarheights.max()))
-                                self.scenex.addItem(medx)
-                                
-                                self.xgview.setScene(self.scenex)
-                                self.xgview.fitInView(0.,0.,self.xgview.size().width(),self.xgview.size().height())
-
-                
-                
+                #the x and y views plot the row and column under the mouse across the part of the image in view,
+                #from imageedit, which holds that part at the step it is shown at
+                if self.ycheckbox.isChecked() or self.xcheckbox.isChecked():
+                    edity,editx = self.editindex(event.ydata,event.xdata)
+                    y0,y1,x0,x1 = self.viewlimits()
+                    ylo,xlo = self.editindex(y0,x0)
+                    yhi,xhi = self.editindex(y1,x1)
+                    if self.ycheckbox.isChecked():
+                        self.ycut.update(self.imageedit[ylo:yhi,editx],self.orig != 'upper')
+                    if self.xcheckbox.isChecked():
+                        self.xcut.update(self.imageedit[edity,xlo:xhi])
+    
     def sliderupdate(self):
         '''
-        Updates the image clipping based on the value of the slider bar.
+        Updates the image clipping based on the value of the slider bar. While the slider is dragged it moves faster
+        than the image can be redrawn, so the redraw waits for the event loop to be free and only the latest value is drawn.
         '''
-        if self.funloaded ==1:
-            self.drawim()    
+        if self.funloaded ==1 and not self.clippending:
+            self.clippending = True
+            QTimer.singleShot(0,self.clipupdate)
+        elif self.funloaded == 1:
+            monitor.count('clip coalesced')
+    
+    def clipupdate(self):
+        self.clippending = False
+        if self.funloaded == 1:
+            self.drawim()
     
+    @timed('scale')
     def scale(self):
         '''
-        Update the image accordingly to which option the user chooses for scaling, log or linear
+        Update the image accordingly to which stretch the user chooses
         '''
         if self.funloaded == 1:
-            if self.lincheck.isChecked():
-                self.imageedit = self.image
-                self.drawim()
-            if self.logcheck.isChecked():
-                self.imageedit = self.image.copy()
-                self.imageedit[np.where(self.imageedit <=0)]=0.001
-                self.imageedit = np.log(self.imageedit)
-                self.drawim()
+            self.editbox = self.viewwindow()
+            y0,y1,x0,x1,step = self.editbox
+            #images shown from a level of the pyramid look different to ones shown by taking every few pixels
+            source = None
+            if self.pyramid != None and step > 1:
+                source = self.pyramid.method
+            name = self.stretchname()
+            self.editstats = self.scalestats()
+            params = ()
+            if name != 'linear':
+                params = self.editstats.stretch.params
+            #the scaled views of every frame and stretch are cached, so going back to one is just a lookup
+            key = (self.imagekey(),self.framenum,name,params,self.editbox,source)
+            self.imageedit = cache.scaled_cache.get(key)
+            if self.imageedit is None:
+                self.imageedit = self.viewstretch(y0,y1,x0,x1,step,source)
+                cache.store_scaled(key,self.imageedit,self.image)
+            self.drawim()
+    
+    def imagekey(self):
+        #what the scaled views of the image being shown are cached under, the file and hdu it came from or
+        #the number of the embedded array
+        if self.entry != None:
+            return self.entry.key()
+        return ('array',self.arraycount)
+    
+    def stretchname(self):
+        '''
+        The name of the stretch picked with the radio buttons
+        '''
+        return self.stretchbuttons[max(self.stretchgroup.checkedId(),0)][0]
+    
+    def stretchchanged(self,index):
+        self.scale()
+    
+    def frameview(self):
+        '''
+        The whole frame at the step it is shown at when zoomed all the way out
+        '''
+        ny,nx = self.image.shape
+        return self.viewdata(0,ny,0,nx,self.levelstep(max(ny,nx)))
+    
+    def framestats(self):
+        '''
+        The statistics of the frame before any stretch, those found when it was loaded if there are some, otherwise
+        worked out from frameview
+        '''
+        key = (self.imagekey(),self.framenum)
+        found = cache.stats_cache.get(key)
+        if found is None:
+            ny,nx = self.image.shape
+            found = stats.compute(self.frameview())
+            found.sampled = self.levelstep(max(ny,nx)) > 1
+            cache.stats_cache.put(key,found,found.nbytes())
+        return found
+    
+    def scalestats(self):
+        '''
+        The statistics of the frame with the stretch picked, which set the color limits. They cover the whole frame
+        and not just the part in view, so the colors stay put while panning. For a stretch other than linear they are
+        found from those of the frame through its stretch_table, which is kept with them and used by scaledata, so
+        the table is only made the first time a frame is shown with a stretch.
+        '''
+        name = self.stretchname()
+        if name == 'linear':
+            return self.framestats()
+        key = (self.imagekey(),self.framenum,name)
+        found = cache.stats_cache.get(key)
+        if found is None:
+            sample = None
+            if name == 'zscale':
+                sample = self.frameview()
+            frame = self.framestats()
+            found = stretch.stretched_stats(frame,stretch.stretch_table(name,frame,sample=sample))
+            cache.stats_cache.put(key,found,found.nbytes())
+        return found
+    
+    def viewstretch(self,y0,y1,x0,x1,step,source):
+        '''
+        The stretched pixels of a window of the frame. The window is quantized once and the levels are kept, so
+        switching to another stretch of the same view is only a lookup in its table.
+        '''
+        if self.stretchname() == 'linear':
+            return self.viewdata(y0,y1,x0,x1,step)
+        found = self.framestats()
+        key = ((y0,y1,x0,x1,step),source)
+        if self.quantized == None or self.quantized[0] is not found or self.quantized[1] != key:
+            knots = stretch.level_knots(found)
+            self.quantized = (found,key,stretch.quantize(self.viewdata(y0,y1,x0,x1,step),knots))
+        return self.editstats.stretch.lookup(self.quantized[2])
+    
+    def scaledata(self,data):
+        '''
+        Applies the stretch the user has chosen to an array, by looking its pixels up in the table of the stretch
+        '''
+        if self.stretchname() == 'linear':
+            return data
+        return self.scalestats().stretch.apply(data)
+    
+    def viewwindow(self):
+        '''
+        Works out which part of the image gets scaled and handed to imshow, returned as y0,y1,x0,x1,step.
+        Only the area in view is used, with a margin of view_margin for panning, so the work done goes with
+        the pixels on the screen rather than the size of the image. It is shown at a step that keeps it about
+        display_pixels across, taken from a level of the pyramid once it has been built.
+        '''
+        ny,nx = self.image.shape
+        y0,y1,x0,x1 = self.viewlimits()
+        step = self.levelstep(max(y1-y0,x1-x0))
+        margin = int(max(y1-y0,x1-x0)*view_margin)
+        y0 = max(y0-margin,0)
+        x0 = max(x0-margin,0)
+        #line the window up on the step so the same pixels are picked each time
+        return y0-y0%step,min(y1+margin,ny),x0-x0%step,min(x1+margin,nx),step
+    
+    def levelstep(self,span):
+        '''
+        The step an area span pixels across is shown at. When there is a pyramid it is rounded down to one of its levels.
+        '''
+        step = view_step(span)
+        if self.pyramid != None:
+            step = min(2**int(np.log2(step)),self.pyramid.coarsest())
+        return step
+    
+    def viewdata(self,y0,y1,x0,x1,step):
+        '''
+        The pixels of the image in a window at a step, out of the pyramid if it has a level for the step
+        '''
+        if self.pyramid != None and step > 1:
+            level = self.pyramid.level(step)
+            if level is not None:
+                return level[y0/step:(y1+step-1)/step,x0/step:(x1+step-1)/step]
+        return self.image[y0:y1:step,x0:x1:step]
+    
+    def buildpyramid(self):
+        '''
+        Starts building the pyramid of the image being viewed in the background, if it is big enough to need
+        one and is not tile compressed. Until it is ready a large image is shown by taking every few pixels.
+        '''
+        if self.pyramider != None:
+            self.pyramider.cancel()
+            self.pyramider = None
+        self.pyramid = None
+        if self.imagecube != None or max(self.image.shape) <= display_pixels:
+            return
+        #building it would decompress every tile of a tile compressed image and hold its lock while doing so,
+        #so those are shown by taking every few pixels of the tiles in view
+        if isinstance(self.image,tiled_image):
+            return
+        self.pyramider = pyramidThread(self.image,self.pyramidmethod,self)
+        QObject.connect(self.pyramider,SIGNAL('progress'),self.pyramidprogress)
+        QObject.connect(self.pyramider,SIGNAL('built'),self.pyramidbuilt)
+        self.pyramider.start()
+    
+    def pyramidprogress(self,builder,msg):
+        if builder is self.pyramider:
+            self.statusbar.showMessage(msg)
+    
+    def pyramidbuilt(self,builder):
+        '''
+        Called when a pyramidThread is done, the view is redrawn from the pyramid
+        '''
+        if builder is not self.pyramider or builder.image is not self.image:
+            return
+        self.pyramider = None
+        if builder.error != None:
+            self.statusbar.showMessage(builder.error)
+            return
+        self.statusbar.clearMessage()
+        self.pyramid = builder.pyramid
+        if self.entry != None and self.entry.image is builder.image:
+            self.entry.pyramid = self.pyramid
+            cache.store(self.entry)
+        self.scale()
+    
+    def buildsummed(self):
+        '''
+        Has the summed area tables of the image being viewed built in the background, if it is held in memory. Tables
+        already built for the frame are taken from summed_cache, otherwise the build waits for summed_delay so frames
+        only passed through are skipped. Until they are ready, or if the image is too big for them or is read from
+        the file as it is looked at, box statistics are worked out from the pixels in the box.
+        '''
+        if self.summer != None:
+            self.summer.cancel()
+            self.summer = None
+        self.summedsoon.stop()
+        found = cache.summed_cache.get((self.imagekey(),self.framenum))
+        if found != None:
+            self.boxes = found
+            return
+        self.boxes = summed.direct_boxes(self.image)
+        #the tables need every pixel, which for a mapped or tile compressed image means reading the whole file
+        if np.prod(self.image.shape) > summed.max_pixels or not cache.in_memory(self.image):
+            return
+        self.summedsoon.start()
+    
+    def startsummed(self):
+        #a cube being played back moves on before the tables would be done, they are built once it stops
+        if self.imagecube != None and getattr(getattr(self,'threed_win',None),'going',0) == 1:
+            return
+        self.summer = summedThread(self.image,(self.imagekey(),self.framenum),self)
+        QObject.connect(self.summer,SIGNAL('built'),self.summedbuilt)
+        self.summer.start()
+    
+    def summedbuilt(self,builder):
+        if builder is not self.summer or builder.image is not self.image:
+            return
+        self.summer = None
+        if builder.error != None:
+            self.statusbar.showMessage(builder.error)
+            return
+        cache.summed_cache.put(builder.key,builder.table,builder.table.nbytes())
+        self.boxes = builder.table
+    
+    def buildstats(self):
+        '''
+        Starts working out the statistics of all of a memory mapped image in the background, when it was shown with
+        those of a sample of it. Tile compressed images keep the sampled ones, all of them would have to be decoded.
+        '''
+        if self.statser != None:
+            self.statser.cancel()
+            self.statser = None
+        key = (self.imagekey(),0)
+        if self.imagecube != None or cache.in_memory(self.image) or isinstance(self.image,tiled_image):
+            return
+        found = cache.stats_cache.get(key)
+        if found != None and not found.sampled:
+            return
+        self.statser = statsThread(self.image,key,self)
+        QObject.connect(self.statser,SIGNAL('done'),self.statsbuilt)
+        self.statser.start()
+    
+    def statsbuilt(self,builder):
+        '''
+        Swaps the statistics of the whole image in for those of the sample, along with everything worked out from them
+        '''
+        if builder is not self.statser:
+            return
+        self.statser = None
+        if builder.error != None:
+            self.statusbar.showMessage(builder.error)
+            return
+        key = builder.key
+        cache.stats_cache.put(key,builder.found,builder.found.nbytes())
+        #the stretches of the frame and its scaled views were made with the sampled statistics
+        cache.stats_cache.discard(lambda other: len(other) > 2 and other[:2] == key)
+        cache.scaled_cache.discard(lambda other: other[:2] == key)
+        if (self.imagekey(),self.framenum) == key:
+            self.scale()
+    
+    def viewlimits(self):
+        '''
+        The pixel range currently in view, as y0,y1,x0,x1
+        '''
+        ny,nx = self.image.shape
+        xlim = sorted(self.imshow.canvas.ax.get_xlim())
+        ylim = sorted(self.imshow.canvas.ax.get_ylim())
+        x0 = min(max(int(np.floor(xlim[0]+0.5)),0),nx-1)
+        x1 = min(max(int(np.ceil(xlim[1]+0.5)),x0+1),nx)
+        y0 = min(max(int(np.floor(ylim[0]+0.5)),0),ny-1)
+        y1 = min(max(int(np.ceil(ylim[1]+0.5)),y0+1),ny)
+        return y0,y1,x0,x1
+    
+    def viewchanged(self,ax):
+        '''
+        Called by matplotlib when the axis limits change, after a zoom or pan. If the view has moved out of
+        the area in imageedit, or zoomed to where another step is wanted, it gets rescaled once the event loop is free.
+        '''
+        if not self.viewpending:
+            self.viewpending = True
+            QTimer.singleShot(0,self.refreshview)
+        else:
+            monitor.count('view coalesced')
+    
+    def refreshview(self):
+        self.viewpending = False
+        if self.funloaded == 1 and self.editbox != None:
+            y0,y1,x0,x1 = self.viewlimits()
+            ey0,ey1,ex0,ex1,step = self.editbox
+            if y0 < ey0 or y1 > ey1 or x0 < ex0 or x1 > ex1 or step != self.levelstep(max(y1-y0,x1-x0)):
+                self.scale()
+    
+    def editindex(self,y,x):
+        '''
+        Turns a pixel position in the image into an index into imageedit
+        '''
+        ey0,ey1,ex0,ex1,step = self.editbox
+        return max(int(y-ey0)/step,0),max(int(x-ex0)/step,0)
+    
+    def editcut(self,y0,y1,x0,x1):
+        '''
+        Returns the scaled image between the given pixel positions. It comes straight out of imageedit when
+        that holds the area at full resolution, otherwise the cut is read from the image and scaled by itself.
+        '''
+        y0,y1,x0,x1 = int(y0),int(y1),int(x0),int(x1)
+        ey0,ey1,ex0,ex1,step = self.editbox
+        if step == 1 and y0 >= ey0 and y1 <= ey1 and x0 >= ex0 and x1 <= ex1:
+            return self.imageedit[y0-ey0:y1-ey0,x0-ex0:x1-ex0]
+        return self.scaledata(self.image[y0:y1,x0:x1])
     
     def cmapupdate(self):
         '''
@@ -804,77 +1466,233 @@ class NTV(QMainWindow,Ui_NTV):
         if self.funloaded == 1:
             self.drawim()
     
-    def loadinfo(self):
+    def loadinfo(self,hdu=None):
         '''
-        Load in a file if no in embeded mode. Function updates labels accordingly
+        Load in a file if no in embeded mode. The file is decoded and its statistics computed on a
+        loadThread, and the viewer is only updated once the data is ready. Opening another file while
+        a load is in progress cancels it. If hdu is given, that extension of the open file is shown
+        instead of opening a new file.
         '''
-        self.previewsize = self.previewsetting
-        self.rebinfactor = 200/self.previewsize/2
-        #Load info if not in embed mode
-        if self.pipe == None:
-		if self.imagecube != None:
-            		self.threed_win.close()
-            		self.imagecube = None
         if self.pipe == None:
-            #close a threed window if one is open
-            self.filelab.setText("<font color=blue>"+self.path+"</font>")
-            self.image,self.head = pf.getdata(self.path,header=True)
-            #This section loads the threed data if there is any. sets the frame as the first element,
-            #similar behaivor happens from the embed side function
-            if len(self.image.shape) == 3:
-                self.imagecube = self.image
-                self.image = self.image[0]
-        #Set label according to embed mode
-        if self.pipe != None:
+            #cancel a load that is still running, anything it produces will be thrown away
+            if self.loader != None:
+                self.loader.cancel()
+                self.loader = None
+            #a file that was opened recently can be shown straight from the cache
+            entry = cache.lookup(self.path,hdu)
+            if entry != None:
+                self.swapin(entry)
+                return
+            if hdu == None:
+                self.filelab.setText("<font color=blue>Loading "+self.path+"</font>")
+                self.loader = loadThread(self.path,self.memmap,self.pixeltype,parent=self)
+            else:
+                #reuse the open file so its headers do not have to be scanned again
+                self.loader = loadThread(self.path,self.memmap,self.pixeltype,parent=self,hdu=hdu,hdulist=self.hdulist,index=self.hduindex)
+            QObject.connect(self.loader,SIGNAL('progress'),self.loadprogress)
+            QObject.connect(self.loader,SIGNAL('loaded'),self.loaded)
+            self.loader.start()
+        else:
+            #Set label according to embed mode, the array is already in memory so there is no need for a thread
             self.filelab.setText("<font color=blue>Numpy Array</font>")
             #set pipe to none to allow data to be loaded from the program.
             self.pipe = None
+            self.entry = None
+            self.framenum = None
+            self.hduindex = []
+            self.hdu = None
+            cache.show(None,self.hdulist)
+            self.hdulist = None
+            self.hdubox.clear()
+            self.hdubox.setEnabled(False)
+            found = stats.compute(self.image)
+            self.arraycount += 1
+            cache.stats_cache.put((self.imagekey(),self.framenum),found,found.nbytes())
+            self.pyramid = None
+            self.showinfo(found.min,found.max)
+            self.buildpyramid()
+            self.buildsummed()
+
+    def loadprogress(self,loader,msg):
+        '''
+        Reports the progress of a loadThread in the status bar, ignoring loads that have been cancelled
+        '''
+        if loader is self.loader:
+            self.statusbar.showMessage(msg)
+
+    def loaded(self,loader):
+        '''
+        Called when a loadThread is done, swaps the new data into the viewer
+        '''
+        if loader is not self.loader:
+            #it was cancelled after it had finished, so nothing will show what it opened
+            cache.release(loader.hdulist)
+            if loader.entry != None:
+                cache.release(loader.entry.imagecube)
+            return
+        self.loader = None
+        if loader.error != None:
+            self.filelab.setText('<font color=red>Could not read file</font>')
+            self.statusbar.showMessage(loader.error)
+            return
+        cache.store(loader.entry,first=loader.first)
+        self.swapin(loader.entry)
+
+    def swapin(self,entry):
+        '''
+        Makes a loaded image, fresh from a loadThread or out of the cache, the one being viewed
+        '''
+        #close a threed window if one is open
+        if self.imagecube != None:
+            self.threed_win.close()
+        #keep the zoom when stepping between extensions of the same size
+        keepzoom = self.funloaded == 1 and entry.index is self.hduindex and self.image.shape == entry.image.shape
+        if entry.index is not self.hduindex:
+            self.hduindex = entry.index
+            self.hdubox.clear()
+            self.hdubox.addItems([info.label() for info in self.hduindex])
+            self.hdubox.setEnabled(len(self.hduindex) > 1)
+        for num in range(len(self.hduindex)):
+            if self.hduindex[num].index == entry.hdu:
+                self.hdubox.setCurrentIndex(num)
+        self.entry = entry
+        self.framenum = 0
+        self.hdu = entry.hdu
+        #the file shown before is closed if the cache has let go of it too
+        cache.show(entry.hdulist,self.hdulist)
+        cache.show(entry.imagecube,self.imagecube)
+        self.hdulist = entry.hdulist
+        self.head = entry.head
+        self.image = entry.image
+        self.imagecube = entry.imagecube
+        self.filelab.setText("<font color=blue>"+entry.path+"</font>")
+        self.statusbar.showMessage('Loaded '+entry.path+' ['+str(entry.hdu)+']',5000)
+        if self.pyramider != None:
+            self.pyramider.cancel()
+            self.pyramider = None
+        self.pyramid = entry.pyramid
+        if self.pyramid != None and self.pyramid.method != self.pyramidmethod:
+            self.pyramid = None
+        self.showinfo(entry.min,entry.max,keepzoom)
+        if self.pyramid == None:
+            self.buildpyramid()
+        self.buildsummed()
+        self.buildstats()
+
+    def showinfo(self,mn,mx,keepzoom=False):
+        '''
+        Updates labels and ui elements for newly loaded data and draws it. The view is reset to the
+        full frame unless keepzoom is set.
+        '''
+        self.previewsize = self.previewsetting
+        self.rebinfactor = 200/self.previewsize/2
         #start up the window that will allow changes to which image in the cube user is viewing
         if self.imagecube != None:
             self.threed_win = three_d(len(self.imagecube),parent=self)
             self.threed_win.show()
-        self.imageedit = self.image
+        #going back to linear should not redraw the old view, the new one is drawn below
+        self.lincheck.blockSignals(True)
+        self.logcheck.blockSignals(True)
         self.lincheck.setChecked(1)
+        self.lincheck.blockSignals(False)
+        self.logcheck.blockSignals(False)
         #Set funloaded to 1 to turn on interactions with UI elements
         self.funloaded = 1
         #make sure default position for clip slide bar is maximum, can change this behaivor later if need be
+        self.clipslide.blockSignals(True)
         self.clipslide.setValue(self.clipslide.maximum())
+        self.clipslide.blockSignals(False)
         #set associated information
-        self.minlab.setText(str(self.image.min()))
-        self.maxlab.setText(str(self.image.max()))
+        self.minlab.setText(str(mn))
+        self.maxlab.setText(str(mx))
         self.xdim.setText(str(self.image.shape[1]))
         self.ydim.setText(str(self.image.shape[0]))
         self.check_preview()
-        self.homeImage = 1
-        self.drawim()
+        if not keepzoom:
+            self.homeview()
+        self.scale()
 
+    @timed('drawim')
     def drawim(self):
         '''
-        This fucntion actually handles the drawing of the imshow mpl canvas. It pulls the required elements from the ui on each redraw
+        This fucntion actually handles the drawing of the imshow mpl canvas. It pulls the required elements from the ui on each redraw.
+        The image artist is only made once, after that its data, extent, color limits and color map are updated in place and it
+        is blitted onto the canvas, which leaves the zoom and pan alone. The whole canvas is only drawn when the artist is new or
+        the axis limits have changed since it was last drawn. matplotlib is handed the image already colored, by coloredit, so
+        it colors it through the same lookup tables as the qt canvases and the minimap instead of its own norm and colormap.
         '''
-        #This is to preserve the zooming when redrawing the image for some reason
-        self.xlims = self.imshow.canvas.ax.get_xlim()
-        self.ylims = self.imshow.canvas.ax.get_ylim()
-        #Clear and update the axis on each redraw, this is nessisary to avoid a memory leak
-        
-        self.imshow.canvas.ax.cla()
-        self.imshow.canvas.format_labels()
-        #The next two lines are a bit hacky but are required to properly turn the color map from the listbox to an object so that the map
-        #can be updated accordingly
+        ax = self.imshow.canvas.ax
+        #The colormap picked in the listbox, out of the lookup tables made when NTV started
         self.ctext = str(self.cmapbox.currentText())
-        exec('self.z = matplotlib.pyplot.cm.'+self.ctext)
-        #This next line sets the maximum value in the image according to what vale the slider bar is at, basicaly its the maximum value times
-        #the ratio of of the silder position over 100 added to the minimum value
-        self.mx = (self.imageedit.max()-self.imageedit.min())*self.clipslide.value()/100. + self.imageedit.min()
-        #updated the canvas and draw
-        self.imdata = self.imshow.canvas.ax.imshow(self.imageedit,vmax=float(self.mx),vmin=self.imageedit.min(),cmap=self.z,interpolation=None,alpha=1,origin=self.orig)
-        self.imshow.canvas.draw()
-        #This next bit checks if the limits should be restored after a redraw, the cases are at the start
-        #of the program or when a new image is loaded  
-        if self.homeImage == 0:
-            self.imshow.canvas.ax.set_ylim(self.ylims)
-            self.imshow.canvas.ax.set_xlim(self.xlims)
-        self.homeImage = 0
+        self.z = luts.get(self.ctext)
+        #This next line sets the maximum value in the image according to what vale the slider bar is at, the value below which that
+        #percent of the pixels fall. It is looked up in the cumulative histogram of the frame, which is only worked out once
+        mn = self.editstats.min
+        self.mx = self.editstats.percentile(self.clipslide.value()/float(stats.percentile_steps))
+        #imageedit may only cover part of the image, the extent puts it in the right place in pixel coordinates
+        y0,y1,x0,x1,step = self.editbox
+        h,w = self.imageedit.shape
+        if self.orig == 'upper':
+            extent = (x0-0.5,x0-0.5+w*step,y0-0.5+h*step,y0-0.5)
+        else:
+            extent = (x0-0.5,x0-0.5+w*step,y0-0.5,y0-0.5+h*step)
+        shown = self.imageedit
+        if self.display == 'matplotlib':
+            shown = self.coloredit(mn,float(self.mx))
+        if self.imdata == None or self.imdata.origin != self.orig:
+            if self.imdata != None:
+                #the origin was changed in the preferences, which turns the y axis around
+                self.imdata.remove()
+                ax.set_ylim(ax.get_ylim()[::-1])
+            self.imdata = ax.imshow(shown,vmax=float(self.mx),vmin=mn,cmap=self.z,interpolation=None,alpha=1,origin=self.orig,extent=extent)
+            self.imshow.canvas.format_labels()
+            self.imshow.canvas.draw()
+            return
+        self.imdata.set_data(shown)
+        self.imdata.set_extent(extent)
+        if self.display != 'matplotlib':
+            self.imdata.set_clim(mn,float(self.mx))
+            self.imdata.set_cmap(self.z)
+        if self.drawnlims != (ax.get_xlim(),ax.get_ylim()):
+            #the ticks need redrawing too
+            self.imshow.canvas.draw()
+        else:
+            self.imshow.canvas.blit_image(self.imdata)
+    
+    def coloredit(self,vmin,vmax):
+        '''
+        imageedit colored with the colormap picked, vmin and vmax being the color limits, as an RGBA array of bytes. The indexes
+        are worked out in buffers that are kept while imageedit stays the same size.
+        '''
+        if self.colorwork == None or self.colorwork[0].shape != self.imageedit.shape:
+            self.colorwork = (np.empty(self.imageedit.shape,np.uint8),np.empty(self.imageedit.shape,np.float32))
+        index,work = self.colorwork
+        lut_index(self.imageedit,vmin,vmax,index,work)
+        return luts.table(self.ctext).take(index,axis=0)
+    
+    def canvasdrawn(self,event):
+        '''
+        Called by matplotlib whenever the whole imshow canvas is drawn, by drawim or by the toolbar, remembering the limits it was drawn with
+        '''
+        ax = self.imshow.canvas.ax
+        self.drawnlims = (ax.get_xlim(),ax.get_ylim())
+    
+    def homeview(self):
+        '''
+        Sets the axis limits to show the whole image, the way imshow does for a new image, and starts the toolbar zoom history over
+        '''
+        ny,nx = self.image.shape
+        ax = self.imshow.canvas.ax
+        ax.set_xlim(-0.5,nx-0.5)
+        if self.orig == 'upper':
+            ax.set_ylim(ny-0.5,-0.5)
+        else:
+            ax.set_ylim(-0.5,ny-0.5)
+        toolbar = self.imshow.toolbar
+        if hasattr(toolbar,'sethome'):
+            toolbar.sethome()
+        else:
+            toolbar.update()
 
 class three_d(QDialog,Ui_threeD,NTV):
     def __init__(self,length,parent):
@@ -884,7 +1702,8 @@ class three_d(QDialog,Ui_threeD,NTV):
         self.length = length
         self.fnumber.setText('0')
         self.fnumbar.setMinimum(0)
-        self.fnumbar.setMaximum(self.length)
+        self.fnumbar.setMaximum(self.length-1)
+        self.cube = parent.imagecube
         QObject.connect(self.fnumbar,SIGNAL('sliderReleased()'),self.go)
         QObject.connect(self.play,SIGNAL('clicked()'),self.playback)
         QObject.connect(self,SIGNAL('changeim'),parent.change_frame)
@@ -898,6 +1717,9 @@ class three_d(QDialog,Ui_threeD,NTV):
             self.going = 1
             self.play.setText('stop')
             self.speed = float(self.delay.text())
+            #let a streamed cube size its read ahead for the playback speed
+            if hasattr(self.cube,'set_playback'):
+                self.cube.set_playback(1,self.speed)
             self.pthread = playThread(self.length,self.speed,parent=self)
             self.pthread.start()
             QObject.connect(self,SIGNAL('die'),self.pthread.kill,Qt.QueuedConnection)
@@ -905,6 +1727,10 @@ class three_d(QDialog,Ui_threeD,NTV):
             self.going = 0
             self.play.setText('play')
             self.emit(SIGNAL('die'))
+            if hasattr(self.cube,'set_playback'):
+                self.cube.set_playback(0)
+            #the frame playback stopped on is shown again, which builds what was skipped while playing
+            self.go()
             
     def update_slider(self,val):
         self.fnumbar.setValue(val)
@@ -958,6 +1784,239 @@ class myThread3(QThread,details_view):
         self.sleep(2)
         self.exec_()
 
+class scaled_image():
+    '''
+    Wraps an image so that slicing it hands back the slice put through func. Used to give the details view
+    a scaled frame without scaling all of an image that is read a piece at a time.
+    '''
+    def __init__(self,image,func):
+        self.image = image
+        self.func = func
+        self.shape = image.shape
+    def __getitem__(self,key):
+        return self.func(self.image[key])
+
+class loadThread(QThread):
+    '''
+    This class is for internal use only. It reads a fits file and computes its min and max off of the
+    gui thread, reporting how far along it is with the progress signal. Once cancel is called the
+    thread stops at the next chance it gets and never emits loaded. Pixels are converted to pixeltype
+    in native byte order as they are read, unless it is None.
+    '''
+    def __init__(self,path,memmap,pixeltype,parent,hdu=None,hdulist=None,index=None):
+        QThread.__init__(self,parent)
+        self.path = path
+        self.memmap = memmap
+        self.pixeltype = pixeltype
+        self.hdu = hdu
+        self.index = index
+        self.cancelled = False
+        self.error = None
+        self.hdulist = hdulist
+        self.image = None
+        self.min = None
+        self.max = None
+        #set if this is the hdu shown when the file is opened, so the cache can find it from just the path
+        self.first = hdu == None
+        self.entry = None
+        QObject.connect(self,SIGNAL('finished()'),self.deleteLater)
+    def cancel(self):
+        self.cancelled = True
+    def run(self):
+        opened = self.hdulist == None
+        try:
+            self.load()
+        except Exception, e:
+            self.error = 'Could not read '+self.path+': '+str(e)
+        #read once, so a cancel that comes in now either closes the file here or stops loaded from being sent
+        cancelled = self.cancelled
+        if cancelled or self.error != None:
+            #nothing else has the file when this load opened it, or the stream of a cube it read
+            if opened and self.hdulist != None:
+                self.hdulist.close()
+            if self.entry != None and hasattr(self.entry.imagecube,'close'):
+                self.entry.imagecube.close()
+        if not cancelled:
+            self.emit(SIGNAL('loaded'),self)
+    def load(self):
+        self.emit(SIGNAL('progress'),self,'Reading '+self.path)
+        path,mtime = os.path.abspath(self.path),os.path.getmtime(self.path)
+        #the hdulist is kept open, a memory mapped image is only valid while the file is, and it makes
+        #switching extensions cheap
+        if self.hdulist == None:
+            self.hdulist = pf.open(self.path,memmap=self.memmap)
+        if self.index == None:
+            self.index = scan_hdus(self.hdulist)
+        if self.hdu == None:
+            self.hdu = default_hdu(self.index)
+        if self.cancelled:
+            return
+        info = [i for i in self.index if i.index == self.hdu]
+        if is_packed(self.path):
+            #a gzipped file can not be read at an offset or mapped, so pyfits decompresses it
+            data = self.hdulist[self.hdu].data
+            if self.pixeltype != None:
+                data = to_native(data,self.pixeltype)
+        elif len(info) > 0 and info[0].compressed and len(info[0].shape) == 2 and can_tile(self.hdulist[self.hdu]):
+            #tile compressed images are only decompressed where they are looked at, as long as this pyfits shows
+            #where the tiles are, otherwise pyfits decompresses all of it below
+            data = tiled_image(self.hdulist[self.hdu],dtype=self.pixeltype)
+        elif len(info) > 0 and not info[0].compressed and len(info[0].shape) == 3:
+            #cubes are read a frame at a time, this has to happen before the data is touched since
+            #pyfits rewrites the scaling keywords once it has scaled the data
+            data = frame_stream(self.path,self.hdulist[self.hdu],self.pixeltype)
+        elif len(info) > 0 and not info[0].compressed and self.pixeltype != None and self.memmap:
+            #mapped from the file and converted as it is sliced, so only what is looked at is read
+            data = mapped_image(self.path,self.hdulist[self.hdu],self.pixeltype)
+        elif len(info) > 0 and not info[0].compressed and self.pixeltype != None:
+            #read straight from the file and converted a block at a time, for the same reason as above
+            progress = lambda done: self.emit(SIGNAL('progress'),self,'Reading '+self.path+' %d%%' % (100*done))
+            data = read_image(self.path,self.hdulist[self.hdu],self.pixeltype,progress,lambda: self.cancelled)
+            if data is None:
+                return
+        else:
+            data = self.hdulist[self.hdu].data
+            if self.pixeltype != None and len(info) > 0 and info[0].compressed:
+                data = to_native(data,self.pixeltype)
+        self.entry = cache.image_entry(path,mtime,self.hdu,self.hdulist,self.index,self.hdulist[self.hdu].header)
+        #This section loads the threed data if there is any. sets the frame as the first element,
+        #similar behaivor happens from the embed side function
+        if len(data.shape) == 3:
+            self.entry.imagecube = data
+            self.image = data[0]
+        else:
+            self.image = data
+        self.findstats()
+        if self.cancelled:
+            return
+        self.entry.image = self.image
+        self.entry.min = self.min
+        self.entry.max = self.max
+    def findstats(self):
+        '''
+        Works out the statistics of the image in one pass, a block of rows at a time, so progress can be
+        reported and the work can be stopped part way through. An image that is not held in memory, a tile
+        compressed or memory mapped one, is only sampled at the step it is first displayed at, so it shows
+        after reading about what is drawn rather than the whole file. For a tile compressed image that also
+        leaves the tiles needed for that display decoded. The statistics of all of a mapped image are worked
+        out by a statsThread once it is shown.
+        '''
+        stride = 1
+        if not cache.in_memory(self.image):
+            stride = view_step(max(self.image.shape))
+        progress = lambda done: self.emit(SIGNAL('progress'),self,'Computing statistics for '+self.path+' %d%%' % (100*done))
+        found = stats.compute(self.image,stride,progress,lambda: self.cancelled)
+        if found == None:
+            return
+        self.min = found.min
+        self.max = found.max
+        if stride == 1:
+            #these are the statistics of the whole first frame, they get used for it unscaled
+            cache.stats_cache.put((self.entry.key(),0),found,found.nbytes())
+
+class catalogThread(QThread):
+    '''
+    This class is for internal use only. It brings the header catalog up to date with a directory off of the
+    gui thread, with its own connection to the catalog database. The headers are read on a pool of worker
+    processes, except on os x where forking a gui program is not safe.
+    '''
+    def __init__(self,folder,parent):
+        QThread.__init__(self,parent)
+        self.folder = folder
+        self.cancelled = False
+        self.error = None
+        self.done = 0
+        QObject.connect(self,SIGNAL('finished()'),self.deleteLater)
+    def cancel(self):
+        self.cancelled = True
+    def run(self):
+        processes = None
+        if os.uname()[0] == 'Darwin':
+            processes = 0
+        try:
+            catalog = header_catalog()
+            try:
+                self.done = catalog.update(self.folder,processes,self.progress,lambda: self.cancelled)
+            finally:
+                catalog.close()
+        except Exception, e:
+            self.error = 'Could not scan '+self.folder+': '+str(e)
+        self.emit(SIGNAL('scanned'),self)
+    def progress(self,done,total):
+        self.emit(SIGNAL('progress'),done,total)
+
+class pyramidThread(QThread):
+    '''
+    This class is for internal use only. It builds the image_pyramid of a large image off of the gui thread,
+    and emits built with itself when it is done, unless it was cancelled first.
+    '''
+    def __init__(self,image,method,parent):
+        QThread.__init__(self,parent)
+        self.image = image
+        self.pyramid = image_pyramid(image,method)
+        self.cancelled = False
+        self.error = None
+        QObject.connect(self,SIGNAL('finished()'),self.deleteLater)
+    def cancel(self):
+        self.cancelled = True
+    def run(self):
+        progress = lambda done: self.emit(SIGNAL('progress'),self,'Building zoomed out views %d%%' % (100*done))
+        try:
+            if not self.pyramid.build(display_pixels,progress,lambda: self.cancelled):
+                return
+        except Exception, e:
+            self.error = 'Could not build zoomed out views: '+str(e)
+        self.emit(SIGNAL('built'),self)
+
+class statsThread(QThread):
+    '''
+    This class is for internal use only. It works out the statistics of every pixel of an image that was first
+    shown with those of a sample of it, and emits done with itself when it is finished, unless it was cancelled
+    first. key is what the statistics get cached under.
+    '''
+    def __init__(self,image,key,parent):
+        QThread.__init__(self,parent)
+        self.image = image
+        self.key = key
+        self.found = None
+        self.cancelled = False
+        self.error = None
+        QObject.connect(self,SIGNAL('finished()'),self.deleteLater)
+    def cancel(self):
+        self.cancelled = True
+    def run(self):
+        try:
+            self.found = stats.compute(self.image,cancelled=lambda: self.cancelled)
+            if self.found == None:
+                return
+        except Exception, e:
+            self.error = 'Could not compute statistics: '+str(e)
+        self.emit(SIGNAL('done'),self)
+
+class summedThread(QThread):
+    '''
+    This class is for internal use only. It builds the summed area tables of an image off of the gui thread,
+    and emits built with itself when it is done, unless it was cancelled first. key is what the tables get
+    cached under.
+    '''
+    def __init__(self,image,key,parent):
+        QThread.__init__(self,parent)
+        self.image = image
+        self.key = key
+        self.table = summed.summed_area(image)
+        self.cancelled = False
+        self.error = None
+        QObject.connect(self,SIGNAL('finished()'),self.deleteLater)
+    def cancel(self):
+        self.cancelled = True
+    def run(self):
+        try:
+            if not self.table.build(cancelled=lambda: self.cancelled):
+                return
+        except Exception, e:
+            self.error = 'Could not build box sums: '+str(e)
+        self.emit(SIGNAL('built'),self)
+
 class playThread(QThread,three_d):
     def __init__(self,length,sleep,parent):
         QThread.__init__(self)
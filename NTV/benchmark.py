@@ -0,0 +1,270 @@
+#! /usr/bin/env python
+'''
+Timings of the numerical work NTV does on an image, for checking that a change really makes it faster.
+Run it from this directory with python benchmark.py, optionally followed by the names of the benchmarks
+to run. Each benchmark prints the best of several runs for each of the cases it compares.
+'''
+import sys
+import time
+
+import numpy as np
+
+import stats
+from loader import to_native
+from pyramid import image_pyramid,reduce as pyramid_reduce
+import stretch
+
+#The size of the frames used, about that of a typical ccd
+frame_shape = (2048,2048)
+
+benchmarks = []
+#Marks a function as a benchmark, they are run in the order they are defined
+def benchmark(func):
+    benchmarks.append(func)
+    return func
+
+#This runs func repeat times and returns the fastest time in seconds
+def best_time(func,repeat=5):
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        func()
+        took = time.time()-start
+        if best == None or took < best:
+            best = took
+    return best
+
+#This prints a line for each case of a benchmark with how long it took and how that compares to the first case
+def report(name,cases):
+    print name
+    base = cases[0][1]
+    for label,took in cases:
+        print '    %-40s %9.2f ms  %6.2fx' % (label,took*1000,base/max(took,1e-9))
+
+#This draws an image into a figure about the size of the NTV main view, the way drawim does, with the view
+#set to limits (x0,x1,y0,y1). step is how many image pixels each pixel of data covers.
+def paint(data,limits,step=1):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=(8,8),dpi=100)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    ax.set_autoscale_on(False)
+    h,w = data.shape
+    ax.imshow(data,origin='upper',interpolation=None,extent=(-0.5,w*step-0.5,h*step-0.5,-0.5))
+    ax.set_xlim(limits[0],limits[1])
+    ax.set_ylim(limits[3],limits[2])
+    canvas.draw()
+
+#The same log stretch NTV.scaledata applies
+def log_scale(data):
+    data = data.copy()
+    data[np.where(data <= 0)] = 0.001
+    return np.log(data)
+
+#The photometry the details view does on a cutout around a star
+def photometry(view,apsize=3,radin=5,radout=8):
+    cutsize = view.shape[0]/2
+    yin,xin = np.indices(view.shape)
+    dist = ((cutsize-xin)**2+(cutsize-yin)**2)**0.5
+    photons = np.sum(view[np.where(dist < apsize)])
+    background = np.median(view[np.where(np.bitwise_and(dist > radin,dist < radout))])
+    return photons-len(np.where(dist < apsize))*background
+
+@benchmark
+def ingest():
+    '''
+    The main numerical paths run on data as pyfits hands it back, big endian float32 or float64 for
+    scaled integers, against the same data converted once to native float32
+    '''
+    from NTV import moments
+    raw = np.random.normal(1000,30,frame_shape).astype('>f4')
+    frames = [('big endian float32 (as stored)',raw),
+              ('float64 (scaled integers)',raw.astype('float64')),
+              ('native float32',to_native(raw,'float32'))]
+    convert = best_time(lambda: to_native(raw,'float32'))
+    paths = [('log stretch',log_scale),
+             ('statistics',stats.compute),
+             ('moments',lambda data: moments(data[1000:1021,1000:1021])),
+             ('photometry',lambda data: photometry(data[1000:1041,1000:1041]))]
+    for name,func in paths:
+        report(name,[(label,best_time(lambda: func(data))) for label,data in frames])
+    print '    converting a frame to native float32 once takes %.2f ms' % (convert*1000)
+
+@benchmark
+def pyramid():
+    '''
+    First paint of a whole 8k frame and paint after zooming in on a quarter of it, drawing every pixel
+    against taking every few pixels and against the pyramid level NTV picks, plus the time to build it
+    '''
+    image = np.random.normal(1000,30,(8192,8192)).astype('float32')
+    for method in ('mean','max'):
+        build = best_time(lambda: image_pyramid(image,method).build(),repeat=1)
+        print '    building the %s pyramid takes %.0f ms' % (method,build*1000)
+    levels = image_pyramid(image)
+    levels.build()
+    whole = (-0.5,8191.5,-0.5,8191.5)
+    report('first paint of the whole frame',
+           [('every pixel',best_time(lambda: paint(image,whole),repeat=3)),
+            ('every 8th pixel',best_time(lambda: paint(image[::8,::8],whole,8),repeat=3)),
+            ('pyramid level 3',best_time(lambda: paint(levels.level(8),whole,8),repeat=3))])
+    quarter = (2047.5,4095.5,2047.5,4095.5)
+    report('paint zoomed in on 2048 pixels',
+           [('every pixel',best_time(lambda: paint(image,quarter),repeat=3)),
+            ('pyramid level 1',best_time(lambda: paint(levels.level(2),quarter,2),repeat=3))])
+
+@benchmark
+def clip():
+    '''
+    Finding the clip limit for a position of the clip slider on a 4k frame, sorting the pixels with
+    np.percentile against looking it up in the percentiles of the cumulative histogram
+    '''
+    image = np.random.normal(1000,30,(4096,4096)).astype('float32')
+    found = stats.compute(image)
+    build = best_time(lambda: stats.compute(image).percentiles(),repeat=1)
+    found.percentiles()
+    report('clip limit for one slider position',
+           [('np.percentile',best_time(lambda: np.percentile(image,99.5),repeat=3)),
+            ('cumulative histogram lookup',best_time(lambda: found.percentile(99.5)))])
+    print '    finding the statistics and percentiles of a frame once takes %.0f ms' % (build*1000)
+
+@benchmark
+def stretches():
+    '''
+    Switching the stretch of a 4k frame shown through a 1536 pixel window, working the log out over the
+    window and its statistics over the frame as NTV used to, against making a table for each stretch and
+    looking up the window, which was quantized once
+    '''
+    image = np.random.normal(1000,30,(4096,4096)).astype('float32')
+    window = image[:1536,:1536]
+    found = stats.compute(image)
+    knots = stretch.level_knots(found)
+    index = stretch.quantize(window,knots)
+    def lookup(name):
+        table = stretch.stretch_table(name,found,sample=image[::4,::4])
+        stretch.stretched_stats(found,table).percentile(99.5)
+        return table.lookup(index)
+    cases = [('log over the pixels and statistics',best_time(lambda: stats.compute(log_scale(window.astype('float64'))),repeat=3))]
+    for name in stretch.names[1:]:
+        cases.append(('table lookup, '+name,best_time(lambda: lookup(name))))
+    report('switching the stretch',cases)
+    print '    quantizing the window once takes %.1f ms' % (best_time(lambda: stretch.quantize(window,knots))*1000)
+
+@benchmark
+def threads():
+    '''
+    The log stretch of a whole 8k frame, done as NTV used to with a copy, np.where and np.log in float64,
+    against the table lookup written into one buffer in blocks of rows, on one thread and on one per core
+    '''
+    import multiprocessing
+    image = np.random.normal(1000,30,(8192,8192)).astype('float32')
+    found = stats.compute(image)
+    table = stretch.stretch_table('log',found)
+    out = np.empty(image.shape,np.float32)
+    cases = [('copy, where and log',best_time(lambda: log_scale(image.astype('float64')),repeat=3))]
+    cores = multiprocessing.cpu_count()
+    for count in sorted(set([1,2,4,cores])):
+        if count > cores:
+            continue
+        stretch.set_threads(count)
+        cases.append(('table lookup on %d threads' % count,best_time(lambda: table.apply(image,out),repeat=3)))
+    stretch.set_threads(None)
+    report('log stretch of the frame',cases)
+
+#The rebin NTV had before resample, which loops over the blocks in python when shrinking
+def loop_rebin(thedata,factor,conserve=None):
+    if factor < 0:
+        oldshape = thedata.shape
+        factor = abs(factor)
+        work = np.zeros(oldshape,thedata.dtype)
+        for i in range(0,oldshape[0],factor):
+            for j in range(0,oldshape[1],factor):
+                if conserve is None:
+                    work[i,j] = thedata[i:i+factor,j:j+factor].mean(dtype=np.float64)
+                else:
+                    work[i,j] = thedata[i:i+factor,j:j+factor].sum(dtype=np.float64)
+        return work[::factor,::factor]
+    work = np.repeat(np.repeat(thedata,factor,axis=0),factor,axis=1)
+    if conserve is None:
+        return work
+    return work/(factor*factor)
+
+@benchmark
+def rebin():
+    '''
+    Shrinking a frame with the python loops rebin used to have against resample, by whole and fractional
+    factors with the mean, sum and max, and enlarging the minimap cutout
+    '''
+    import resample
+    image = np.random.normal(1000,30,frame_shape).astype('float32')
+    report('shrinking the frame by 4',
+           [('python loops, mean',best_time(lambda: loop_rebin(image,-4),repeat=1)),
+            ('python loops, sum',best_time(lambda: loop_rebin(image,-4,True),repeat=1)),
+            ('resample, mean',best_time(lambda: resample.downsample(image,4,'mean'))),
+            ('resample, sum',best_time(lambda: resample.downsample(image,4,'sum'))),
+            ('resample, max',best_time(lambda: resample.downsample(image,4,'max'))),
+            ('pyramid reduce twice',best_time(lambda: pyramid_reduce(pyramid_reduce(image))))])
+    report('shrinking the frame by other factors',
+           [('resample, 3 with partial edges',best_time(lambda: resample.downsample(image,3))),
+            ('resample, 2.5',best_time(lambda: resample.downsample(image,2.5))),
+            ('resample, 2.5 trimmed',best_time(lambda: resample.downsample(image,2.5,edge='trim')))])
+    cutout = image[1000:1040,1000:1040]
+    report('enlarging the minimap cutout by 5',
+           [('repeat',best_time(lambda: loop_rebin(cutout,5))),
+            ('resample',best_time(lambda: resample.upsample(cutout,5)))])
+
+@benchmark
+def boxes():
+    '''
+    The mean and variance of boxes of several sizes around a pixel, summing the pixels in the box against
+    four lookups in the summed area tables, plus the time to build the tables
+    '''
+    import summed
+    image = np.random.normal(1000,30,frame_shape).astype('float32')
+    direct = summed.direct_boxes(image)
+    table = summed.summed_area(image)
+    build = best_time(table.build,repeat=3)
+    for size in (5,25,250):
+        report('box %d pixels across' % (2*size+1),
+               [('summing the box',best_time(lambda: direct.around(1000,1000,size))),
+                ('summed area tables',best_time(lambda: table.around(1000,1000,size)))])
+    print '    building the tables takes %.1f ms' % (build*1000)
+
+@benchmark
+def canvas():
+    '''
+    Redrawing the main view after a pan on a 4k frame, with matplotlib against the qt canvas, which maps
+    the pixels through the colormap lookup table once and then only scales the pixmap for each pan
+    '''
+    from PyQt4.QtCore import QRectF
+    from PyQt4.QtGui import QApplication,QImage,QPainter
+    from colormaps import luts,lut_index
+    app = QApplication.instance() or QApplication(sys.argv)
+    image = np.random.normal(1000,30,(4096,4096)).astype('float32')
+    #the view draws a 1024 pixel window at a step of 4 plus the margin around it
+    data = image[::4,::4]
+    rgb = luts.apply('gray',lut_index(data,900.,1100.))
+    source = QImage(rgb.data,rgb.shape[1],rgb.shape[0],rgb.shape[1]*4,QImage.Format_RGB32)
+    screen = QImage(800,800,QImage.Format_RGB32)
+    def pan():
+        painter = QPainter(screen)
+        painter.drawImage(QRectF(0,0,800,800),source,QRectF(100,100,800,800))
+        painter.end()
+    whole = (-0.5,4095.5,-0.5,4095.5)
+    report('redraw after a pan',
+           [('matplotlib',best_time(lambda: paint(data,whole,4),repeat=3)),
+            ('lookup table then scaling',best_time(lambda: luts.apply('gray',lut_index(data,900.,1100.)))+best_time(pan)),
+            ('scaling only',best_time(pan))])
+    print '    a frame at 60 fps has 16.7 ms'
+
+def main(names):
+    for func in benchmarks:
+        if len(names) == 0 or func.__name__ in names:
+            print '== '+func.__name__+': '+' '.join(func.__doc__.split())
+            func()
+
+if __name__ == '__main__':
+    #nothing is shown, so draw without a window
+    import matplotlib
+    matplotlib.use('Agg')
+    main(sys.argv[1:])
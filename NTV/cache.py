@@ -0,0 +1,278 @@
+#! /usr/bin/env python
+'''
+The in memory cache of recently opened images. Going back to a file that was opened a little while
+ago takes it from here instead of reading it, finding its statistics and scaling it all over again.
+There is one cache for the whole process, image_cache, shared by everything that loads files, and one
+of the scaled views of frames that have been shown, scaled_cache, one of their statistics, stats_cache, and
+one of their summed area tables, summed_cache.
+'''
+import os
+import mmap
+import threading
+try:
+    from collections import OrderedDict
+except ImportError:
+    OrderedDict = None
+
+import numpy as np
+
+#This works out how much memory an array is really holding on to. Memory mapped arrays are backed by the
+#file and cost nothing here, the operating system pages them in and out as it needs to.
+def resident_bytes(data):
+    if data is None:
+        return 0
+    #images that are decompressed a piece at a time know how much they have decoded
+    if hasattr(data,'cachesize'):
+        return data.cachesize
+    if not in_memory(data):
+        return 0
+    return getattr(data,'nbytes',0)
+
+#This checks if an image is an array held in memory, rather than one mapped from its file or decoded a piece
+#at a time, so reading all of it costs nothing more than going over it
+def in_memory(data):
+    if not isinstance(data,np.ndarray):
+        return False
+    base = data
+    while base is not None:
+        if isinstance(base,(np.memmap,mmap.mmap)):
+            return False
+        base = getattr(base,'base',None)
+    return True
+
+class lru_cache():
+    '''
+    A dictionary with a byte budget. Every item is stored with its size, and when the total goes over
+    maxbytes the least recently used items are thrown out. If dropped is given it is called with each
+    item that is thrown out, replaced or removed, once the cache is unlocked again. It is safe to use
+    from several threads.
+    '''
+    def __init__(self,maxbytes,dropped=None):
+        self.maxbytes = maxbytes
+        self.dropped = dropped
+        self.total = 0
+        self.sizes = {}
+        if OrderedDict != None:
+            self.items = OrderedDict()
+        else:
+            self.items = {}
+        self.lock = threading.Lock()
+    def __len__(self):
+        return len(self.items)
+    def __contains__(self,key):
+        return key in self.items
+    def values(self):
+        self.lock.acquire()
+        try:
+            return list(self.items.values())
+        finally:
+            self.lock.release()
+    def get(self,key,default=None):
+        '''
+        Returns the item for key, marking it as the most recently used
+        '''
+        self.lock.acquire()
+        try:
+            if key not in self.items:
+                return default
+            value = self.items.pop(key)
+            self.items[key] = value
+            return value
+        finally:
+            self.lock.release()
+    def put(self,key,value,nbytes):
+        '''
+        Adds or replaces an item, putting it in as the most recently used, and evicts whatever no longer fits
+        '''
+        self.lock.acquire()
+        try:
+            gone = []
+            if key in self.items:
+                old = self.items.pop(key)
+                self.total -= self.sizes.pop(key)
+                if old is not value:
+                    gone.append(old)
+            self.items[key] = value
+            self.sizes[key] = nbytes
+            self.total += nbytes
+            gone += self.evict()
+        finally:
+            self.lock.release()
+        self.drop(gone)
+    def remove(self,key):
+        self.lock.acquire()
+        try:
+            gone = []
+            if key in self.items:
+                gone.append(self.items.pop(key))
+                self.total -= self.sizes.pop(key)
+        finally:
+            self.lock.release()
+        self.drop(gone)
+    def discard(self,test):
+        '''
+        Removes every item whose key test returns true for
+        '''
+        self.lock.acquire()
+        try:
+            gone = []
+            for key in [key for key in self.items.keys() if test(key)]:
+                gone.append(self.items.pop(key))
+                self.total -= self.sizes.pop(key)
+        finally:
+            self.lock.release()
+        self.drop(gone)
+    def resize(self,maxbytes):
+        self.lock.acquire()
+        try:
+            self.maxbytes = maxbytes
+            gone = self.evict()
+        finally:
+            self.lock.release()
+        self.drop(gone)
+    def clear(self):
+        self.lock.acquire()
+        try:
+            gone = list(self.items.values())
+            self.items.clear()
+            self.sizes.clear()
+            self.total = 0
+        finally:
+            self.lock.release()
+        self.drop(gone)
+    def evict(self):
+        #the most recent item is always kept, even if it is bigger than the whole budget. The items thrown
+        #out are returned.
+        gone = []
+        while self.total > self.maxbytes and len(self.items) > 1:
+            if OrderedDict != None:
+                key,value = self.items.popitem(last=False)
+            else:
+                key = self.items.keys()[0]
+                value = self.items.pop(key)
+            self.total -= self.sizes.pop(key)
+            gone.append(value)
+        return gone
+    def drop(self,gone):
+        if self.dropped != None:
+            for value in gone:
+                self.dropped(value)
+
+class image_entry():
+    '''
+    Everything NTV keeps about one hdu of a file once it has been loaded: the open hdulist, the index of
+    its hdus, the header and the data. Scaled versions of it are kept in scaled_cache and the statistics of its
+    frames in stats_cache.
+    '''
+    def __init__(self,path,mtime,hdu,hdulist=None,index=None,head=None,image=None,imagecube=None,mn=None,mx=None):
+        self.path = path
+        self.mtime = mtime
+        self.hdu = hdu
+        self.hdulist = hdulist
+        self.index = index
+        self.head = head
+        self.image = image
+        self.imagecube = imagecube
+        self.min = mn
+        self.max = mx
+        #the image_pyramid of a large image, built in the background after it is loaded
+        self.pyramid = None
+    def key(self):
+        return (self.path,self.mtime,self.hdu)
+    def nbytes(self):
+        if self.imagecube is not None:
+            #the image is a view into the cube, so it is not counted again
+            size = resident_bytes(self.imagecube)
+        else:
+            size = resident_bytes(self.image)
+        if self.pyramid != None:
+            size += self.pyramid.nbytes()
+        return size
+
+#The open files of the images being shown, their hdulists and the frame_streams of cubes, which are kept open
+#even once image_cache has let go of their entries
+shown = []
+
+#This closes an open file of an entry, an hdulist or a frame_stream, once nothing needs it any more, which is once
+#it is not being shown and no entry in image_cache has it. The entries for different hdus of a file share its
+#hdulist. Anything without a close, such as a cube held in memory, is left alone.
+def release(opened):
+    if opened is None or not hasattr(opened,'close'):
+        return
+    #an hdulist is a list, so it is looked for by identity rather than with in
+    for held in shown:
+        if held is opened:
+            return
+    for entry in image_cache.values():
+        if isinstance(entry,image_entry) and (entry.hdulist is opened or entry.imagecube is opened):
+            return
+    opened.close()
+
+#This marks opened as being shown in place of previous, closing previous if nothing else needs it
+def show(opened,previous):
+    for num in range(len(shown)):
+        if shown[num] is previous:
+            shown.pop(num)
+            break
+    if hasattr(opened,'close'):
+        shown.append(opened)
+    if previous is not opened:
+        release(previous)
+
+#This is called with whatever image_cache throws out, the cached hdu numbers of files are let go with nothing to do
+def drop_entry(entry):
+    if isinstance(entry,image_entry):
+        release(entry.hdulist)
+        release(entry.imagecube)
+
+#The one cache shared by the whole program, NTV sets the budget from the preferences
+image_cache = lru_cache(512*1024**2,drop_entry)
+
+#The cache of statistics of frames, keyed by what the image is cached under, the frame number and the name of
+#the stretch, or by just the first two for the unscaled data. Each one has a histogram of stats.hist_bins bins
+#and a stretch has its table too, half a megabyte or more, which over the frames of a long cube adds up, so
+#they have a budget of their own. NTV sets it from the preferences.
+stats_cache = lru_cache(64*1024**2)
+
+#The cache of summed area tables of frames, keyed by the image they came from and the frame. Each takes eight
+#times the memory of a float32 frame or more, so they have a budget of their own. NTV sets it from the preferences.
+summed_cache = lru_cache(128*1024**2)
+
+#The cache of scaled views of frames, keyed by the image they came from, the frame, the stretch and its
+#settings, and the window and step. NTV sets the budget from the preferences.
+scaled_cache = lru_cache(128*1024**2)
+
+#This puts a scaled view of image into scaled_cache. A linear scaling of an array is just a slice of it,
+#which costs nothing to make again, and keeping it would hold on to the image after image_cache lets it go,
+#so it is left out.
+def store_scaled(key,scaled,image):
+    if isinstance(image,np.ndarray) and np.may_share_memory(scaled,image):
+        return
+    scaled_cache.put(key,scaled,resident_bytes(scaled))
+
+#This gives the path and modification time a file is cached under, or None if it cannot be read
+def file_key(path):
+    try:
+        return os.path.abspath(path),os.path.getmtime(path)
+    except OSError:
+        return None
+
+#This looks for an hdu of a file in the cache. When hdu is None the entry for whichever hdu gets shown
+#when the file is first opened is returned. A file that has changed on disk since it was cached has a
+#different modification time, so it is never found.
+def lookup(path,hdu=None):
+    key = file_key(path)
+    if key == None:
+        return None
+    if hdu == None:
+        hdu = image_cache.get(key+(None,))
+        if hdu == None:
+            return None
+    return image_cache.get(key+(hdu,))
+
+#This puts an entry into the cache, or updates its size if it has grown. If first is set the entry is
+#also remembered as the one to show when its file is opened without picking an hdu.
+def store(entry,first=False):
+    if first:
+        image_cache.put((entry.path,entry.mtime,None),entry.hdu,0)
+    image_cache.put(entry.key(),entry,entry.nbytes())
@@ -0,0 +1,190 @@
+#! /usr/bin/env python
+'''
+A catalog of the fits headers in a directory tree, kept in a small sqlite database. Only headers
+are read, on a pool of worker processes, and a file is only read again if it has changed since it
+was last scanned. Queries such as "FILTER=R and EXPTIME>60" are answered from indexes on the
+keyword values, so they stay fast over tens of thousands of files.
+'''
+import os
+import re
+import sqlite3
+import multiprocessing
+
+import pyfits as pf
+
+from loader import is_fits
+
+#Where the catalog is kept unless told otherwise, one database covers every directory scanned
+default_db = os.path.join(os.path.expanduser('~'),'.ntv_catalog.db')
+
+#cards that are not keyword=value pairs and are left out of the catalog
+skip_keys = ('','COMMENT','HISTORY')
+
+schema = '''
+create table if not exists files (id integer primary key, path text unique, mtime real);
+create table if not exists cards (file integer, hdu integer, key text, text text, num real);
+create index if not exists cards_num on cards (key,num);
+create index if not exists cards_text on cards (key,text collate nocase);
+create index if not exists cards_file on cards (file);
+'''
+
+#This reads the headers of every hdu of a file and returns the path, its modification time and a list of
+#(hdu,key,text,number) rows. number is None for values that are not numbers. It runs in the worker
+#processes, so it has to live at the top of the module.
+def scan_file(path):
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return path,None,[]
+    rows = []
+    try:
+        hdulist = pf.open(path,memmap=True)
+        try:
+            for hdu in range(len(hdulist)):
+                for key,value in hdulist[hdu].header.items():
+                    if key in skip_keys:
+                        continue
+                    num = None
+                    if not isinstance(value,bool):
+                        try:
+                            num = float(value)
+                        except (TypeError,ValueError):
+                            pass
+                    if isinstance(value,bool):
+                        value = value and 'T' or 'F'
+                    rows.append((hdu,key,str(value).strip(),num))
+        finally:
+            hdulist.close()
+    except Exception:
+        #a file that can not be read is still recorded, so it is not tried again until it changes
+        pass
+    return path,mtime,rows
+
+#This splits a query into (key,operator,value) conditions, they are joined with "and"
+condition = re.compile(r'^\s*([A-Za-z0-9_\-]+)\s*(<=|>=|!=|=|<|>)\s*(.+?)\s*$')
+def parse_query(text):
+    conditions = []
+    for part in re.split(r'(?i)\s+and\s+',text.strip()):
+        if part.strip() == '':
+            continue
+        match = condition.match(part)
+        if match == None:
+            raise ValueError('Could not understand "'+part.strip()+'"')
+        key,op,value = match.groups()
+        if len(value) > 1 and value[0] == value[-1] and value[0] in '\'"':
+            value = value[1:-1]
+        conditions.append((key.upper(),op,value))
+    return conditions
+
+class header_catalog():
+    '''
+    The header catalog kept in the sqlite database at dbpath. update brings it up to date with the fits
+    files under a directory, and query returns the files whose headers match a query.
+    '''
+    def __init__(self,dbpath=default_db):
+        self.dbpath = dbpath
+        self.db = sqlite3.connect(dbpath)
+        self.db.executescript(schema)
+    def close(self):
+        self.db.close()
+    def update(self,folder,processes=None,progress=None,cancelled=None):
+        '''
+        Scans the fits files under folder that are new or have changed since the last scan, and drops files
+        that have gone away. The headers are read on processes worker processes, one per cpu if it is None,
+        or on this thread if it is 0. progress is called with the number of files done and the number to do,
+        and the scan stops early if cancelled returns true. Returns the number of files scanned.
+        '''
+        folder = os.path.abspath(folder)
+        paths = []
+        for root,dirs,names in os.walk(folder):
+            paths.extend([os.path.join(root,name) for name in names if is_fits(name)])
+        known = {}
+        prefix = os.path.join(folder,'')
+        for path,mtime in self.db.execute('select path,mtime from files where substr(path,1,?) = ?',(len(prefix),prefix)):
+            known[path] = mtime
+        todo = []
+        for path in paths:
+            try:
+                if known.get(path) != os.path.getmtime(path):
+                    todo.append(path)
+            except OSError:
+                pass
+        gone = set(known.keys())-set(paths)
+        for path in gone:
+            self.remove(path)
+        if len(todo) == 0:
+            self.db.commit()
+            return 0
+        if processes == 0:
+            #scan on this thread, for where forking is not safe
+            pool = None
+            results = (scan_file(path) for path in todo)
+        else:
+            pool = multiprocessing.Pool(processes)
+            results = pool.imap_unordered(scan_file,todo,chunksize=16)
+        done = 0
+        try:
+            for path,mtime,rows in results:
+                if mtime != None:
+                    self.add(path,mtime,rows)
+                done += 1
+                if done % 500 == 0:
+                    self.db.commit()
+                if progress != None:
+                    progress(done,len(todo))
+                if cancelled != None and cancelled():
+                    break
+        finally:
+            if pool != None:
+                pool.terminate()
+                pool.join()
+            self.db.commit()
+        return done
+    def add(self,path,mtime,rows):
+        '''
+        Puts the header rows of a file in the catalog, replacing anything it had for the file before
+        '''
+        self.remove(path)
+        cursor = self.db.execute('insert into files (path,mtime) values (?,?)',(path,mtime))
+        fileid = cursor.lastrowid
+        self.db.executemany('insert into cards (file,hdu,key,text,num) values (?,?,?,?,?)',
+                            [(fileid,hdu,key,text,num) for hdu,key,text,num in rows])
+    def remove(self,path):
+        for (fileid,) in self.db.execute('select id from files where path = ?',(path,)).fetchall():
+            self.db.execute('delete from cards where file = ?',(fileid,))
+            self.db.execute('delete from files where id = ?',(fileid,))
+    def query(self,text):
+        '''
+        Returns the sorted paths of the files whose headers match every condition in text. Conditions look
+        like KEY=value, KEY!=value, KEY>number and so on, joined with "and". Numbers are compared as numbers,
+        anything else is compared as text ignoring case, and a * in text matches anything. A condition holds
+        for a file if a card with its key in any hdu of the file satisfies it, so files without the key never
+        match, not even with !=.
+        '''
+        sql = 'select path from files where 1'
+        args = []
+        for key,op,value in parse_query(text):
+            try:
+                num = float(value)
+                sql += ' and id in (select file from cards where key = ? and num '+op.replace('!=','<>')+' ?)'
+                args.extend([key,num])
+            except ValueError:
+                if op not in ('=','!='):
+                    raise ValueError('Only = and != can be used with text values')
+                if '*' in value:
+                    #like already ignores case for plain letters, the % and _ wildcards of like are escaped
+                    #so that only * matches anything
+                    test = "text like ? escape '\\'"
+                    for c in ('\\','%','_'):
+                        value = value.replace(c,'\\'+c)
+                    value = value.replace('*','%')
+                else:
+                    test = 'text = ? collate nocase'
+                if op == '!=':
+                    test = 'not '+test
+                sql += ' and id in (select file from cards where key = ? and '+test+')'
+                args.extend([key,value])
+        sql += ' order by path'
+        return [row[0] for row in self.db.execute(sql,args)]
+    def count(self):
+        return self.db.execute('select count(*) from files').fetchone()[0]
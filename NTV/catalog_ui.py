@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+# Form implementation generated from reading ui file 'catalog.ui'
+#
+# Created: Sat Oct 17 15:02:40 2026
+#      by: PyQt4 UI code generator 4.5.4
+#
+# WARNING! All changes made in this file will be lost!
+
+from PyQt4 import QtCore, QtGui
+
+class Ui_catalog(object):
+    def setupUi(self, catalog):
+        catalog.setObjectName("catalog")
+        catalog.resize(503, 450)
+        catalog.setModal(False)
+        self.verticalLayout = QtGui.QVBoxLayout(catalog)
+        self.verticalLayout.setObjectName("verticalLayout")
+        self.horizontalLayout = QtGui.QHBoxLayout()
+        self.horizontalLayout.setObjectName("horizontalLayout")
+        self.label = QtGui.QLabel(catalog)
+        self.label.setObjectName("label")
+        self.horizontalLayout.addWidget(self.label)
+        self.folderset = QtGui.QLineEdit(catalog)
+        self.folderset.setObjectName("folderset")
+        self.horizontalLayout.addWidget(self.folderset)
+        self.browsebutton = QtGui.QPushButton(catalog)
+        self.browsebutton.setObjectName("browsebutton")
+        self.horizontalLayout.addWidget(self.browsebutton)
+        self.scanbutton = QtGui.QPushButton(catalog)
+        self.scanbutton.setObjectName("scanbutton")
+        self.horizontalLayout.addWidget(self.scanbutton)
+        self.verticalLayout.addLayout(self.horizontalLayout)
+        self.horizontalLayout_2 = QtGui.QHBoxLayout()
+        self.horizontalLayout_2.setObjectName("horizontalLayout_2")
+        self.label_2 = QtGui.QLabel(catalog)
+        self.label_2.setObjectName("label_2")
+        self.horizontalLayout_2.addWidget(self.label_2)
+        self.queryset = QtGui.QLineEdit(catalog)
+        self.queryset.setObjectName("queryset")
+        self.horizontalLayout_2.addWidget(self.queryset)
+        self.verticalLayout.addLayout(self.horizontalLayout_2)
+        self.resultlist = QtGui.QListWidget(catalog)
+        self.resultlist.setObjectName("resultlist")
+        self.verticalLayout.addWidget(self.resultlist)
+        self.statuslabel = QtGui.QLabel(catalog)
+        self.statuslabel.setObjectName("statuslabel")
+        self.verticalLayout.addWidget(self.statuslabel)
+
+        self.retranslateUi(catalog)
+        QtCore.QMetaObject.connectSlotsByName(catalog)
+
+    def retranslateUi(self, catalog):
+        catalog.setWindowTitle(QtGui.QApplication.translate("catalog", "Header Catalog", None, QtGui.QApplication.UnicodeUTF8))
+        self.label.setText(QtGui.QApplication.translate("catalog", "Directory", None, QtGui.QApplication.UnicodeUTF8))
+        self.browsebutton.setText(QtGui.QApplication.translate("catalog", "Browse", None, QtGui.QApplication.UnicodeUTF8))
+        self.scanbutton.setText(QtGui.QApplication.translate("catalog", "Scan", None, QtGui.QApplication.UnicodeUTF8))
+        self.label_2.setText(QtGui.QApplication.translate("catalog", "Search", None, QtGui.QApplication.UnicodeUTF8))
+        self.queryset.setToolTip(QtGui.QApplication.translate("catalog", "For example FILTER=R and EXPTIME>60, a * in text matches anything", None, QtGui.QApplication.UnicodeUTF8))
+
@@ -0,0 +1,76 @@
+#! /usr/bin/env python
+'''
+Lookup tables for the colormaps NTV offers. Each colormap is turned into a 256 entry RGBA table once,
+and after that coloring an image is mapping its pixels onto 0 to 255 and indexing the table with them,
+rather than going back to matplotlib. There is one registry for the whole process, luts, shared by the
+main view and the minimap.
+'''
+import numpy as np
+import matplotlib.cm
+
+#This maps data onto indexes 0 to 255 of a lookup table, vmin going to 0 and vmax to 255. NaNs get 0. The
+#indexes are written into out, a uint8 array, and work is a float32 array of the same shape to work them out
+#in, so that nothing is made when both are given.
+def lut_index(data,vmin,vmax,out=None,work=None):
+    span = float(vmax-vmin)
+    if span <= 0:
+        span = 1.
+    if work is None:
+        work = np.empty(np.shape(data),np.float32)
+    np.subtract(data,vmin,work)
+    work *= 255./span
+    np.minimum(work,255,work)
+    #fmax does not pass NaNs through, which is how they end up at 0 without a mask
+    np.fmax(work,0,work)
+    if out is None:
+        return work.astype(np.uint8)
+    out[...] = work
+    return out
+
+class lookup_tables():
+    '''
+    The colormaps by name, each with its matplotlib colormap, its 256x4 RGBA table of bytes, the table
+    packed as 0xffRRGGBB the way a QImage of Format_RGB32 lays pixels out, and the same as a list for the
+    color table of a Format_Indexed8 QImage. A colormap is made the first time it is asked for.
+    '''
+    def __init__(self):
+        self.cmaps = {}
+        self.rgba = {}
+        self.packed = {}
+        self.colortables = {}
+    def build(self,names):
+        '''
+        Makes the tables of every colormap in names up front, so none are made while drawing
+        '''
+        for name in names:
+            self.get(name)
+    def get(self,name):
+        '''
+        The matplotlib colormap called name
+        '''
+        if name not in self.cmaps:
+            cmap = matplotlib.cm.get_cmap(name)
+            rgba = cmap(np.linspace(0,1,256),bytes=True)
+            wide = rgba.astype(np.uint32)
+            packed = (255 << 24) | (wide[:,0] << 16) | (wide[:,1] << 8) | wide[:,2]
+            self.cmaps[name] = cmap
+            self.rgba[name] = rgba
+            self.packed[name] = packed
+            self.colortables[name] = [int(color) for color in packed]
+        return self.cmaps[name]
+    def table(self,name):
+        self.get(name)
+        return self.rgba[name]
+    def rgb32(self,name):
+        self.get(name)
+        return self.packed[name]
+    def colortable(self,name):
+        self.get(name)
+        return self.colortables[name]
+    def apply(self,name,index):
+        '''
+        Colors an array of indexes made by lut_index, returning 0xffRRGGBB pixels
+        '''
+        return self.rgb32(name)[index]
+
+luts = lookup_tables()
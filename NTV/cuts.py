@@ -0,0 +1,112 @@
+#! /usr/bin/env python
+'''
+The x and y cut views beside the main view, which plot the row and column of pixels under the mouse. Each
+view keeps one scene with one path item for the cut and two labels for its maximum and median, and a move
+of the mouse only gives the path new points and moves the labels. A cut with more pixels than the view is
+tall or wide is reduced to the min and max of the pixels falling on each screen pixel, so narrow peaks stay
+in the plot however long the row, and the plot never has more points than about twice the screen pixels.
+'''
+from PyQt4.QtCore import *
+from PyQt4.QtGui import *
+
+import numpy as np
+
+#This makes a QPolygonF of count points along with a numpy array of shape (count,2) that shares its memory,
+#so the points can be written without going through python for each one
+def shared_polygon(count):
+    polygon = QPolygonF(count)
+    buffer = polygon.data()
+    buffer.setsize(count*2*np.dtype(np.float64).itemsize)
+    return polygon,np.frombuffer(buffer,np.float64).reshape(count,2)
+
+#This reduces values to the min and max of each of buckets runs of them, interleaved, so they can be drawn
+#as a line going down and up through each bucket. It returns the positions of the points, in units of the
+#original values, and the values.
+def minmax_decimate(values,buckets):
+    starts = np.floor(np.arange(buckets)*(len(values)/float(buckets))).astype(np.intp)
+    decimated = np.empty(2*buckets,values.dtype)
+    #fmin and fmax pass over NaNs, a bucket only comes out NaN if all of it is
+    decimated[0::2] = np.fmin.reduceat(values,starts)
+    decimated[1::2] = np.fmax.reduceat(values,starts)
+    positions = np.repeat(starts+0.5*np.diff(np.append(starts,len(values))),2)
+    return positions,decimated
+
+class cut_view():
+    '''
+    A cut plotted in view, a QGraphicsView. vertical is for the y cut, which runs down the view with the
+    values to the right, rather than along it with the values going up.
+    '''
+    def __init__(self,view,vertical=False):
+        self.view = view
+        self.vertical = vertical
+        self.scene = QGraphicsScene()
+        #everything moves on every update, so an index of where the items are would only slow it down
+        self.scene.setItemIndexMethod(QGraphicsScene.NoIndex)
+        self.line = QGraphicsPathItem()
+        self.maxlabel = QGraphicsTextItem()
+        self.medlabel = QGraphicsTextItem()
+        if vertical:
+            self.maxlabel.rotate(90)
+            self.medlabel.rotate(90)
+        for item in (self.line,self.maxlabel,self.medlabel):
+            self.scene.addItem(item)
+        self.polygon = None
+        self.points = None
+        self.size = None
+        view.setScene(self.scene)
+        view.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        view.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+    def update(self,values,flip=False):
+        '''
+        Plots values, the pixels of the cut in order. flip runs them the other way, for the y cut of an image
+        shown with its origin at the bottom.
+        '''
+        values = np.asarray(values).ravel()
+        total = len(values)
+        finite = values[np.isfinite(values)]
+        if len(finite) == 0:
+            self.line.setPath(QPainterPath())
+            self.maxlabel.setPlainText('')
+            self.medlabel.setPlainText('')
+            return
+        #the statistics are worked out once per cut, on the pixels before any are decimated away
+        lo = float(finite.min())
+        hi = float(finite.max())
+        median = float(np.median(finite))
+        span = hi-lo or 1.
+        size = self.view.viewport().size()
+        width,height = float(size.width()),float(size.height())
+        length = height if self.vertical else width
+        if len(values) > 2*length:
+            positions,values = minmax_decimate(values,max(int(length),1))
+        else:
+            positions = np.arange(len(values))+0.5
+        count = len(values)
+        if self.points is None or len(self.points) != count:
+            self.polygon,self.points = shared_polygon(count)
+        along = positions*(length/total)
+        if flip:
+            along = length-along
+        #NaNs have nothing to plot, so they are drawn at the minimum
+        scaled = np.nan_to_num((values-lo)/span)
+        if self.vertical:
+            self.points[:,0] = scaled*width
+            self.points[:,1] = along
+        else:
+            self.points[:,0] = along
+            self.points[:,1] = (1-scaled)*height
+        path = QPainterPath()
+        path.addPolygon(self.polygon)
+        self.line.setPath(path)
+        self.maxlabel.setPlainText('Maximum: '+str(hi))
+        self.medlabel.setPlainText('Median: '+str(median))
+        if self.vertical:
+            self.maxlabel.setPos(width,10)
+            self.medlabel.setPos((median-lo)/span*width,10)
+        else:
+            self.maxlabel.setPos(10,0)
+            self.medlabel.setPos(10,(1-(median-lo)/span)*height)
+        if (width,height) != self.size:
+            #the scene is kept the size of the view, so it is drawn without any scaling
+            self.size = (width,height)
+            self.scene.setSceneRect(0,0,width,height)
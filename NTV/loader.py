@@ -0,0 +1,208 @@
+#! /usr/bin/env python
+'''
+This module holds the functions NTV uses to get pixel data off of disk. It is kept separate
+from the gui code so that nothing in here needs a running QApplication.
+'''
+import os
+
+import numpy as np
+import pyfits as pf
+
+from tiles import fix_index
+
+#older pyfits builds without the compression module do not have this
+compimage = getattr(pf,'CompImageHDU',None)
+
+#maps the BITPIX card onto the numpy type the data is stored as on disk
+bitpix_types = {8:'uint8',16:'>i2',32:'>i4',64:'>i8',-32:'>f4',-64:'>f8'}
+
+#About how much raw data is converted at a time when pixels are read in
+ingest_bytes = 16*1024**2
+
+class hdu_info():
+    '''
+    A description of one image hdu, built only from its header. Used to fill the extension selector
+    without reading any pixel data.
+    '''
+    def __init__(self,index,header):
+        self.index = index
+        self.extname = str(header.get('EXTNAME',''))
+        #tile compressed images keep the image description in the Z keywords
+        if header.get('ZIMAGE',False):
+            self.compressed = True
+            self.bitpix = header['ZBITPIX']
+            naxis = header['ZNAXIS']
+            self.shape = tuple([header['ZNAXIS%d' % i] for i in range(naxis,0,-1)])
+        else:
+            self.compressed = False
+            self.bitpix = header['BITPIX']
+            naxis = header['NAXIS']
+            self.shape = tuple([header['NAXIS%d' % i] for i in range(naxis,0,-1)])
+        if 'BSCALE' in header or 'BZERO' in header:
+            #scaled data is handed back as floats
+            if self.bitpix == -64 or self.bitpix == 32 or self.bitpix == 64:
+                self.dtype = np.dtype('float64')
+            else:
+                self.dtype = np.dtype('float32')
+        else:
+            self.dtype = np.dtype(bitpix_types[self.bitpix])
+    def label(self):
+        '''
+        The text shown for this hdu in the extension selector
+        '''
+        name = str(self.index)
+        if self.extname != '':
+            name += ' '+self.extname
+        return name+' '+'x'.join([str(n) for n in self.shape[::-1]])+' BITPIX='+str(self.bitpix)
+
+#The extensions of files NTV opens, tile compressed ones included, and those of files compressed as a whole
+#that pyfits opens through the compression
+fits_extensions = ('.fits','.fit','.fts','.fz')
+packed_extensions = ('.gz','.bz2','.zip')
+
+#This checks if a file name looks like something NTV can open. Only the extension of the name is looked at,
+#so a directory with fits somewhere in its path is not taken for a file.
+def is_fits(path):
+    root,ext = os.path.splitext(os.path.basename(path).lower())
+    if ext in packed_extensions:
+        root,ext = os.path.splitext(root)
+    return ext in fits_extensions
+
+#The first bytes of the compressed file formats pyfits opens transparently, gzip, bzip2 and zip
+packed_magic = ('\x1f\x8b','BZh','PK\x03\x04')
+
+#This checks if a file is compressed as a whole, such as a .fits.gz, rather than tile compressed. The pixels of
+#those are not at their data offset in the file, so they can only be read through pyfits.
+def is_packed(path):
+    infile = open(path,'rb')
+    try:
+        start = infile.read(4)
+    finally:
+        infile.close()
+    return start.startswith(packed_magic)
+
+#This scans the headers of an open hdulist and returns an hdu_info for every hdu that holds a 2 or 3
+#dimensional image. pyfits reads headers and data lazily, so this never touches the data units.
+def scan_hdus(hdulist):
+    index = []
+    for i in range(len(hdulist)):
+        header = hdulist[i].header
+        if header.get('XTENSION','IMAGE').strip() not in ('IMAGE','BINTABLE'):
+            continue
+        if header.get('XTENSION','IMAGE').strip() == 'BINTABLE' and not header.get('ZIMAGE',False):
+            continue
+        info = hdu_info(i,header)
+        #pyfits hands compressed images back with the image header, so they are told apart by class
+        if compimage != None and isinstance(hdulist[i],compimage):
+            info.compressed = True
+        if len(info.shape) == 2 or len(info.shape) == 3:
+            index.append(info)
+    return index
+
+#The hdu to show when a file is first opened, the first one with an image in it
+def default_hdu(index):
+    if len(index) == 0:
+        return 0
+    return index[0].index
+
+#This finds where the data of an hdu starts in its file, pyfits has kept it under a couple of names
+def data_offset(hdu):
+    if hasattr(hdu,'fileinfo'):
+        return hdu.fileinfo()['datLoc']
+    return hdu._datLoc
+
+#The BSCALE, BZERO and BLANK of an hdu, BLANK only means something for integer data
+def scaling(header):
+    blank = None
+    if header['BITPIX'] > 0:
+        blank = header.get('BLANK',None)
+    return header.get('BSCALE',1),header.get('BZERO',0),blank
+
+#This converts a block of raw pixels into out, which sets the type and byte order, applying the scaling.
+#Blank pixels become NaN when out holds floats.
+def convert_block(raw,out,bscale=1,bzero=0,blank=None):
+    out[...] = raw
+    if bscale != 1:
+        out *= bscale
+    if bzero != 0:
+        out += bzero
+    if blank != None and out.dtype.kind == 'f':
+        out[raw == blank] = np.nan
+    return out
+
+#This reads an uncompressed image hdu straight out of its file a block of rows at a time, converting each
+#block to native byte order and dtype as it goes, with BSCALE, BZERO and BLANK applied. pyfits would hand
+#back big endian data, or scale it all to float64 at once, both of which every numpy operation after that
+#pays for. Only the output and one block of raw data are ever in memory. Like frame_stream it has to be
+#called before the data of the hdu is touched, since pyfits rewrites the scaling keywords once it has
+#scaled the data. progress is called with the fraction done, and None is returned if cancelled returns true.
+#The file must not be compressed as a whole, see is_packed.
+def read_image(path,hdu,dtype='float32',progress=None,cancelled=None):
+    header = hdu.header
+    shape = tuple([header['NAXIS%d' % i] for i in range(header['NAXIS'],0,-1)])
+    rawtype = np.dtype(bitpix_types[header['BITPIX']])
+    bscale,bzero,blank = scaling(header)
+    out = np.empty(shape,dtype)
+    rowbytes = rawtype.itemsize*int(np.prod(shape[1:]))
+    step = max(ingest_bytes/max(rowbytes,1),1)
+    infile = open(path,'rb')
+    try:
+        infile.seek(data_offset(hdu))
+        for start in range(0,shape[0],step):
+            if cancelled != None and cancelled():
+                return None
+            if progress != None:
+                progress(start/float(shape[0]))
+            stop = min(start+step,shape[0])
+            raw = np.frombuffer(infile.read((stop-start)*rowbytes),rawtype).reshape((stop-start,)+shape[1:])
+            convert_block(raw,out[start:stop],bscale,bzero,blank)
+    finally:
+        infile.close()
+    return out
+
+class mapped_image():
+    '''
+    Array like access to an uncompressed two dimensional image hdu that is memory mapped from its file, for
+    when NTV is set to memory map images and to convert them. Nothing is read when it is made. Each slice is
+    converted to dtype in native byte order with BSCALE, BZERO and BLANK applied as it is taken, so only the
+    pixels that are displayed or measured are paged in and converted. Like read_image it has to be made before
+    the data of the hdu is touched.
+    '''
+    def __init__(self,path,hdu,dtype='float32'):
+        header = hdu.header
+        self.shape = (header['NAXIS2'],header['NAXIS1'])
+        self.ndim = 2
+        self.dtype = np.dtype(dtype)
+        self.bscale,self.bzero,self.blank = scaling(header)
+        rawtype = np.dtype(bitpix_types[header['BITPIX']])
+        self.raw = np.memmap(path,rawtype,'r',data_offset(hdu),self.shape)
+        #the mapped pages belong to the file, so they are not counted against the image cache
+        self.cachesize = 0
+    def __len__(self):
+        return self.shape[0]
+    def __array__(self,dtype=None):
+        data = self[:,:]
+        if dtype != None:
+            data = data.astype(dtype)
+        return data
+    def __getitem__(self,key):
+        if not isinstance(key,tuple):
+            key = (key,)
+        raw = np.asarray(self.raw[tuple([fix_index(k) for k in key])])
+        out = convert_block(raw,np.empty(raw.shape,self.dtype),self.bscale,self.bzero,self.blank)
+        if out.ndim == 0:
+            return out[()]
+        return out
+
+#This converts an array that is already in memory, such as one passed in from embed, to native byte order
+#and dtype a block of rows at a time, so there is never a whole temporary copy on top of the two arrays
+def to_native(data,dtype='float32'):
+    dtype = np.dtype(dtype)
+    if data.dtype == dtype:
+        return data
+    out = np.empty(data.shape,dtype)
+    rowbytes = data.dtype.itemsize*int(np.prod(data.shape[1:]))
+    step = max(ingest_bytes/max(rowbytes,1),1)
+    for start in range(0,data.shape[0],step):
+        convert_block(data[start:start+step],out[start:start+step])
+    return out
@@ -0,0 +1,97 @@
+#! /usr/bin/env python
+'''
+The minimap, the enlarged view of the pixels around the mouse in the side panel. It is redrawn on every
+move of the mouse, so everything it needs is made once and reused: the indexes of the cutout are written
+into the pixels of the same Indexed8 QImage each time, which has the color table of the colormap, and Qt
+enlarges that onto a pixmap kept for the label. The crosshair is painted on top of the pixmap rather than
+into the pixels, so it neither changes the data nor depends on the color limits.
+'''
+from PyQt4.QtCore import *
+from PyQt4.QtGui import *
+
+import numpy as np
+
+from colormaps import luts,lut_index
+
+#The color of the crosshair
+crosshair_color = Qt.white
+
+class minimap():
+    '''
+    Draws the minimap into label. setup has to be called with the number of image pixels either side of the
+    mouse and how many screen pixels each one takes up before anything is drawn, and again whenever they change.
+    '''
+    def __init__(self,label):
+        self.label = label
+        self.size = None
+        self.factor = None
+        self.cmapname = None
+        self.cross = (0,0)
+    def setup(self,size,factor):
+        '''
+        Makes the buffers for a cutout of 2*size pixels across, each shown factor screen pixels wide. Nothing is
+        done if they are already that size.
+        '''
+        if (size,factor) == (self.size,self.factor):
+            return
+        self.size = size
+        self.factor = factor
+        across = 2*size
+        self.work = np.zeros((across,across),np.float32)
+        #the image owns its pixels and the indexes are written through bits. An image made on a numpy buffer
+        #would be copied by setColorTable, after which writes to the buffer would no longer show.
+        self.image = QImage(across,across,QImage.Format_Indexed8)
+        self.image.fill(0)
+        self.pixmap = QPixmap(across*factor,across*factor)
+        self.target = QRect(0,0,across*factor,across*factor)
+        #a new image has no color table, so it has to be set again
+        self.cmapname = None
+    def window(self,y,x,shape):
+        '''
+        The part of an image of shape to show with the mouse at y,x, as y0,y1,x0,x1. It is centred on the mouse
+        except at the edges, where it stops at the edge and the crosshair moves off the centre instead.
+        '''
+        across = 2*self.size
+        iy = min(max(int(y+0.5),0),shape[0]-1)
+        ix = min(max(int(x+0.5),0),shape[1]-1)
+        y0 = max(min(iy-self.size,shape[0]-across),0)
+        x0 = max(min(ix-self.size,shape[1]-across),0)
+        self.cross = (iy-y0,ix-x0)
+        return y0,min(y0+across,shape[0]),x0,min(x0+across,shape[1])
+    def pixels(self):
+        '''
+        The pixels of the image as a uint8 array that shares its memory. It is fetched again for every draw,
+        bits can move the pixels if Qt has shared them since.
+        '''
+        across = 2*self.size
+        buffer = self.image.bits()
+        buffer.setsize(self.image.byteCount())
+        return np.frombuffer(buffer,np.uint8).reshape(across,self.image.bytesPerLine())[:,:across]
+    def draw(self,cut,vmin,vmax,cmapname,flip=False):
+        '''
+        Shows cut, the scaled pixels of the last window, with vmin and vmax as the color limits. flip turns it
+        upside down, for images shown with their origin at the bottom.
+        '''
+        h,w = cut.shape
+        cy,cx = self.cross
+        if flip:
+            cut = cut[::-1]
+            cy = h-1-cy
+        if cmapname != self.cmapname:
+            self.image.setColorTable(luts.colortable(cmapname))
+            self.cmapname = cmapname
+        index = self.pixels()
+        if (h,w) != index.shape:
+            #only an image smaller than the minimap is cut short, the rest stays at the bottom of the colormap
+            index[:] = 0
+        lut_index(cut,vmin,vmax,index[:h,:w],self.work[:h,:w])
+        painter = QPainter(self.pixmap)
+        painter.drawImage(self.target,self.image)
+        #two pixels of crosshair on each side of the one under the mouse
+        f = self.factor
+        painter.fillRect(cx*f,(cy-2)*f,f,2*f,crosshair_color)
+        painter.fillRect(cx*f,(cy+1)*f,f,2*f,crosshair_color)
+        painter.fillRect((cx-2)*f,cy*f,2*f,f,crosshair_color)
+        painter.fillRect((cx+1)*f,cy*f,2*f,f,crosshair_color)
+        painter.end()
+        self.label.setPixmap(self.pixmap)
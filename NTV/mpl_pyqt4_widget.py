@@ -44,6 +44,14 @@ class MyMplCanvas(FigureCanvas):
 			ylabel.set_fontsize(8)
 			ylabel.set_color('b')
 
+	def blit_image(self, image):
+		#redraws only the axes background, one image on it and the axes frame, then blits the axes
+		self.ax.draw_artist(self.ax.patch)
+		self.ax.draw_artist(image)
+		for spine in self.ax.spines.values():
+			self.ax.draw_artist(spine)
+		self.blit(self.ax.bbox)
+
 	def sizeHint(self):
 		w, h = self.get_width_height()
 		return QSize(w, h)
@@ -12,7 +12,7 @@ from PyQt4 import QtCore, QtGui
 class Ui_prefs(object):
     def setupUi(self, prefs):
         prefs.setObjectName("prefs")
-        prefs.resize(400, 215)
+        prefs.resize(400, 355)
         self.verticalLayout_2 = QtGui.QVBoxLayout(prefs)
         self.verticalLayout_2.setObjectName("verticalLayout_2")
         self.horizontalLayout = QtGui.QHBoxLayout()
@@ -31,6 +31,21 @@ class Ui_prefs(object):
         self.label_4 = QtGui.QLabel(prefs)
         self.label_4.setObjectName("label_4")
         self.verticalLayout.addWidget(self.label_4)
+        self.label_5 = QtGui.QLabel(prefs)
+        self.label_5.setObjectName("label_5")
+        self.verticalLayout.addWidget(self.label_5)
+        self.label_6 = QtGui.QLabel(prefs)
+        self.label_6.setObjectName("label_6")
+        self.verticalLayout.addWidget(self.label_6)
+        self.label_7 = QtGui.QLabel(prefs)
+        self.label_7.setObjectName("label_7")
+        self.verticalLayout.addWidget(self.label_7)
+        self.label_8 = QtGui.QLabel(prefs)
+        self.label_8.setObjectName("label_8")
+        self.verticalLayout.addWidget(self.label_8)
+        self.label_9 = QtGui.QLabel(prefs)
+        self.label_9.setObjectName("label_9")
+        self.verticalLayout.addWidget(self.label_9)
         self.horizontalLayout.addLayout(self.verticalLayout)
         self.gridLayout = QtGui.QGridLayout()
         self.gridLayout.setObjectName("gridLayout")
@@ -59,6 +74,30 @@ class Ui_prefs(object):
         self.preview10 = QtGui.QRadioButton(prefs)
         self.preview10.setObjectName("preview10")
         self.gridLayout.addWidget(self.preview10, 0, 2, 1, 2)
+        self.memmapcheck = QtGui.QCheckBox(prefs)
+        self.memmapcheck.setObjectName("memmapcheck")
+        self.gridLayout.addWidget(self.memmapcheck, 4, 0, 1, 3)
+        self.cachesizeset = QtGui.QLineEdit(prefs)
+        self.cachesizeset.setMaximumSize(QtCore.QSize(50, 16777215))
+        self.cachesizeset.setObjectName("cachesizeset")
+        self.gridLayout.addWidget(self.cachesizeset, 5, 0, 1, 2)
+        self.pixeltypebox = QtGui.QComboBox(prefs)
+        self.pixeltypebox.setObjectName("pixeltypebox")
+        self.pixeltypebox.addItem(QtCore.QString())
+        self.pixeltypebox.addItem(QtCore.QString())
+        self.pixeltypebox.addItem(QtCore.QString())
+        self.gridLayout.addWidget(self.pixeltypebox, 6, 0, 1, 3)
+        self.pyramidbox = QtGui.QComboBox(prefs)
+        self.pyramidbox.setObjectName("pyramidbox")
+        self.pyramidbox.addItem(QtCore.QString())
+        self.pyramidbox.addItem(QtCore.QString())
+        self.gridLayout.addWidget(self.pyramidbox, 7, 0, 1, 3)
+        self.displaybox = QtGui.QComboBox(prefs)
+        self.displaybox.setObjectName("displaybox")
+        self.displaybox.addItem(QtCore.QString())
+        self.displaybox.addItem(QtCore.QString())
+        self.displaybox.addItem(QtCore.QString())
+        self.gridLayout.addWidget(self.displaybox, 8, 0, 1, 3)
         self.horizontalLayout.addLayout(self.gridLayout)
         self.verticalLayout_2.addLayout(self.horizontalLayout)
         self.ok_sync = QtGui.QPushButton(prefs)
@@ -75,6 +114,11 @@ class Ui_prefs(object):
         self.label_2.setText(QtGui.QApplication.translate("prefs", "Default cut size", None, QtGui.QApplication.UnicodeUTF8))
         self.label_3.setText(QtGui.QApplication.translate("prefs", "Plot Origin", None, QtGui.QApplication.UnicodeUTF8))
         self.label_4.setText(QtGui.QApplication.translate("prefs", "Dialog Box Behaivor", None, QtGui.QApplication.UnicodeUTF8))
+        self.label_5.setText(QtGui.QApplication.translate("prefs", "File Loading", None, QtGui.QApplication.UnicodeUTF8))
+        self.label_6.setText(QtGui.QApplication.translate("prefs", "Cache Size (MB)", None, QtGui.QApplication.UnicodeUTF8))
+        self.label_7.setText(QtGui.QApplication.translate("prefs", "Pixel Type", None, QtGui.QApplication.UnicodeUTF8))
+        self.label_8.setText(QtGui.QApplication.translate("prefs", "Zoomed Out View", None, QtGui.QApplication.UnicodeUTF8))
+        self.label_9.setText(QtGui.QApplication.translate("prefs", "Main View", None, QtGui.QApplication.UnicodeUTF8))
         self.preview20.setText(QtGui.QApplication.translate("prefs", "20", None, QtGui.QApplication.UnicodeUTF8))
         self.preview5.setText(QtGui.QApplication.translate("prefs", "5", None, QtGui.QApplication.UnicodeUTF8))
         self.cutsizeset.setText(QtGui.QApplication.translate("prefs", "3", None, QtGui.QApplication.UnicodeUTF8))
@@ -83,5 +127,16 @@ class Ui_prefs(object):
         self.overplot.setText(QtGui.QApplication.translate("prefs", "Overplot", None, QtGui.QApplication.UnicodeUTF8))
         self.multi.setText(QtGui.QApplication.translate("prefs", "Multi Windows", None, QtGui.QApplication.UnicodeUTF8))
         self.preview10.setText(QtGui.QApplication.translate("prefs", "10", None, QtGui.QApplication.UnicodeUTF8))
+        self.memmapcheck.setText(QtGui.QApplication.translate("prefs", "Memory map", None, QtGui.QApplication.UnicodeUTF8))
+        self.cachesizeset.setText(QtGui.QApplication.translate("prefs", "512", None, QtGui.QApplication.UnicodeUTF8))
+        self.pixeltypebox.setItemText(0, QtGui.QApplication.translate("prefs", "float32", None, QtGui.QApplication.UnicodeUTF8))
+        self.pixeltypebox.setItemText(1, QtGui.QApplication.translate("prefs", "float64", None, QtGui.QApplication.UnicodeUTF8))
+        self.pixeltypebox.setItemText(2, QtGui.QApplication.translate("prefs", "As Stored", None, QtGui.QApplication.UnicodeUTF8))
+        self.pyramidbox.setItemText(0, QtGui.QApplication.translate("prefs", "Mean", None, QtGui.QApplication.UnicodeUTF8))
+        self.pyramidbox.setItemText(1, QtGui.QApplication.translate("prefs", "Max", None, QtGui.QApplication.UnicodeUTF8))
+        self.displaybox.setItemText(0, QtGui.QApplication.translate("prefs", "Matplotlib", None, QtGui.QApplication.UnicodeUTF8))
+        self.displaybox.setItemText(1, QtGui.QApplication.translate("prefs", "QImage", None, QtGui.QApplication.UnicodeUTF8))
+        self.displaybox.setItemText(2, QtGui.QApplication.translate("prefs", "OpenGL", None, QtGui.QApplication.UnicodeUTF8))
+        self.displaybox.setToolTip(QtGui.QApplication.translate("prefs", "Takes effect the next time NTV starts", None, QtGui.QApplication.UnicodeUTF8))
         self.ok_sync.setText(QtGui.QApplication.translate("prefs", "Ok", None, QtGui.QApplication.UnicodeUTF8))
 
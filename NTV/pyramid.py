@@ -0,0 +1,80 @@
+#! /usr/bin/env python
+'''
+Image pyramids for showing frames much bigger than the screen. Each level of the pyramid is the level
+below it shrunk by two in each direction, so when the whole of an 8k frame is in view NTV hands the
+1k level to matplotlib instead of all 64 million pixels, and moves to finer levels as you zoom in.
+'''
+import math
+
+import numpy as np
+
+import resample
+
+#About how many pixels are reduced at a time while a level is being built
+block_pixels = 4*1024**2
+
+#This halves an image in each direction, combining each 2x2 block of pixels into one by taking their mean
+#or their max. The max keeps stars from fading away in the coarse levels. An odd last row or column is
+#combined on its own, so every pixel of the image ends up in the level.
+def reduce(data,method='mean'):
+    data = np.asarray(data)
+    if method != 'max' and data.dtype.kind != 'f':
+        data = data.astype('float32')
+    return resample.downsample(data,2,method)
+
+class image_pyramid():
+    '''
+    A stack of ever smaller versions of an image. levels[0] is the image itself and levels[k] is it shrunk
+    by 2**k, so pixel (i,j) of a level covers the pixels of the image from (i*2**k,j*2**k) up to the next
+    one. The levels are made by build, usually off of the gui thread, and anything that can be sliced by
+    rows can be the image, including a tiled_image.
+    '''
+    def __init__(self,image,method='mean'):
+        self.method = method
+        self.levels = [image]
+    def build(self,smallest=1024,progress=None,cancelled=None):
+        '''
+        Adds levels until one fits within smallest pixels across, a block of rows at a time. progress is called
+        with the fraction of the work done, and if cancelled returns true it stops and returns False.
+        '''
+        total = self.work(smallest)
+        done = 0
+        while max(self.levels[-1].shape) > smallest:
+            source = self.levels[-1]
+            ny,nx = source.shape
+            level = None
+            #blocks are an even number of rows so no 2x2 block gets split
+            step = max(block_pixels/max(nx,1)/2,1)*2
+            for start in range(0,ny,step):
+                if cancelled != None and cancelled():
+                    return False
+                block = reduce(source[start:start+step],self.method)
+                if level is None:
+                    level = np.empty(((ny+1)/2,block.shape[1]),block.dtype)
+                level[start/2:start/2+block.shape[0]] = block
+                done += min(step,ny-start)*nx
+                if progress != None:
+                    progress(done/float(total))
+            self.levels.append(level)
+        return True
+    def work(self,smallest):
+        #the number of pixels build has to look at, for reporting progress
+        ny,nx = self.levels[-1].shape
+        total = 0
+        while max(ny,nx) > smallest:
+            total += ny*nx
+            ny,nx = (ny+1)/2,(nx+1)/2
+        return max(total,1)
+    def level(self,step):
+        '''
+        The level that shrinks the image by step, or None if there is not one
+        '''
+        k = int(round(math.log(step,2)))
+        if 2**k != step or k >= len(self.levels):
+            return None
+        return self.levels[k]
+    def coarsest(self):
+        return 2**(len(self.levels)-1)
+    def nbytes(self):
+        #the image itself is not counted, that is up to whoever owns it
+        return sum([level.nbytes for level in self.levels[1:]])
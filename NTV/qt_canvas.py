@@ -0,0 +1,353 @@
+#! /usr/bin/env python
+'''
+A main view for NTV that paints the image with Qt instead of matplotlib. The pixels are turned into
+bytes through the 256 entry lookup table of the colormap once when the data, color limits or colormap
+change, and kept as a pixmap, so panning and zooming only has Qt scale part of the pixmap onto the
+screen. On a QGLWidget the pixmap is uploaded as an OpenGL texture and scaled by the graphics card.
+
+It only stands in for the small part of the matplotlib api NTV uses on its main view: mpl_connect with
+events carrying xdata and ydata, an axes with get and set for the limits and xlim_changed and ylim_changed
+callbacks, and an image artist made by imshow with set_data, set_extent, set_clim and set_cmap.
+'''
+from PyQt4.QtCore import *
+from PyQt4.QtGui import *
+
+import numpy as np
+
+try:
+    from PyQt4.QtOpenGL import QGLWidget
+    hasopengl = 1
+except:
+    hasopengl = 0
+
+from mpl_pyqt4_widget import MPL_Widget
+from colormaps import luts,lut_index
+
+#How much one step of the mouse wheel or one click of a zoom button zooms by
+zoom_factor = 1.25
+
+class canvas_event():
+    '''
+    A mouse event, with the same attributes matplotlib gives its events. xdata and ydata are None when
+    the mouse is not over the image.
+    '''
+    def __init__(self,name,canvas,x,y,xdata,ydata,button=None):
+        self.name = name
+        self.canvas = canvas
+        self.x = x
+        self.y = y
+        self.xdata = xdata
+        self.ydata = ydata
+        self.button = button
+        self.inaxes = xdata != None and canvas.ax or None
+
+class callback_list():
+    '''
+    Functions to call for named events, handed out ids by connect so they can be disconnected
+    '''
+    def __init__(self):
+        self.funcs = {}
+        self.nextid = 0
+    def connect(self,name,func):
+        self.nextid += 1
+        self.funcs[self.nextid] = (name,func)
+        return self.nextid
+    def disconnect(self,cid):
+        self.funcs.pop(cid,None)
+    def process(self,name,*args):
+        for cid,(fname,func) in sorted(self.funcs.items()):
+            if fname == name:
+                func(*args)
+
+class canvas_image():
+    '''
+    The image shown on a canvas_axes, made by its imshow. The pixmap is only remade when it is drawn
+    after something has changed.
+    '''
+    def __init__(self,axes,data,vmin,vmax,cmap,origin,extent):
+        self.axes = axes
+        self.origin = origin
+        self.data = data
+        self.vmin = vmin
+        self.vmax = vmax
+        self.cmap = cmap
+        if extent == None:
+            h,w = data.shape
+            if origin == 'upper':
+                extent = (-0.5,w-0.5,h-0.5,-0.5)
+            else:
+                extent = (-0.5,w-0.5,-0.5,h-0.5)
+        self.extent = extent
+        self.pixmap = None
+        self.flipped = False
+    def set_data(self,data):
+        self.data = data
+        self.pixmap = None
+    def set_extent(self,extent):
+        self.extent = extent
+    def get_extent(self):
+        return self.extent
+    def set_clim(self,vmin,vmax):
+        self.vmin = vmin
+        self.vmax = vmax
+        self.pixmap = None
+    def set_cmap(self,cmap):
+        if cmap.name != self.cmap.name:
+            self.pixmap = None
+        self.cmap = cmap
+    def remove(self):
+        self.axes.images.remove(self)
+    def rows(self):
+        #the y positions of the outer edges of the first and last rows
+        left,right,bottom,top = self.extent
+        if self.origin == 'upper':
+            return top,bottom
+        return bottom,top
+    def get_pixmap(self,flipped):
+        '''
+        The pixmap of the image, upside down if flipped, made from the data if anything has changed
+        '''
+        if self.pixmap == None or flipped != self.flipped:
+            rgb = luts.apply(self.cmap.name,lut_index(self.data,self.vmin,self.vmax))
+            if flipped:
+                rgb = rgb[::-1]
+            rgb = np.ascontiguousarray(rgb)
+            h,w = rgb.shape
+            image = QImage(rgb.data,w,h,w*4,QImage.Format_RGB32)
+            #fromImage copies the pixels, so rgb can go once it is made
+            self.pixmap = QPixmap.fromImage(image)
+            self.flipped = flipped
+        return self.pixmap
+
+class canvas_axes():
+    '''
+    The limits of what is shown on a canvas and the images on it. As in matplotlib the first y limit is at
+    the bottom of the view, so an image with its origin at the top has the y limits the other way round.
+    The aspect ratio is always one, so whichever axis has room to spare shows more than its limits.
+    '''
+    def __init__(self,canvas):
+        self.canvas = canvas
+        self.xlim = (0.,1.)
+        self.ylim = (0.,1.)
+        self.images = []
+        self.callbacks = callback_list()
+    def set_autoscale_on(self,on):
+        #the limits are only ever changed by being set, so there is nothing to turn off
+        pass
+    def imshow(self,data,vmax=None,vmin=None,cmap=None,interpolation=None,alpha=1,origin='upper',extent=None):
+        image = canvas_image(self,data,vmin,vmax,cmap,origin,extent)
+        self.images.append(image)
+        return image
+    def transform(self):
+        '''
+        The scale in screen pixels per data unit and the x and y directions, -1 where the axis runs backwards
+        '''
+        w = max(self.canvas.width(),1)
+        h = max(self.canvas.height(),1)
+        dx = self.xlim[1]-self.xlim[0] or 1.
+        dy = self.ylim[1]-self.ylim[0] or 1.
+        return min(w/abs(dx),h/abs(dy)),np.sign(dx),np.sign(dy)
+    def to_screen(self,x,y):
+        scale,sx,sy = self.transform()
+        px = self.canvas.width()/2.+(x-sum(self.xlim)/2.)*scale*sx
+        py = self.canvas.height()/2.-(y-sum(self.ylim)/2.)*scale*sy
+        return px,py
+    def to_data(self,px,py):
+        scale,sx,sy = self.transform()
+        x = (px-self.canvas.width()/2.)/(scale*sx)+sum(self.xlim)/2.
+        y = -(py-self.canvas.height()/2.)/(scale*sy)+sum(self.ylim)/2.
+        return x,y
+    def get_xlim(self):
+        #the range actually on screen, which is wider than was set when the canvas is the wider shape
+        x0,y0 = self.to_data(0,0)
+        x1,y1 = self.to_data(self.canvas.width(),self.canvas.height())
+        return (x0,x1)
+    def get_ylim(self):
+        x0,y0 = self.to_data(0,self.canvas.height())
+        x1,y1 = self.to_data(self.canvas.width(),0)
+        return (y0,y1)
+    def set_xlim(self,left,right=None):
+        if right == None:
+            left,right = left
+        self.xlim = (float(left),float(right))
+        self.callbacks.process('xlim_changed',self)
+        self.canvas.update()
+    def set_ylim(self,bottom,top=None):
+        if top == None:
+            bottom,top = bottom
+        self.ylim = (float(bottom),float(top))
+        self.callbacks.process('ylim_changed',self)
+        self.canvas.update()
+    def set_view(self,xlim,ylim):
+        #sets both limits at once, for panning and zooming
+        self.xlim = (float(xlim[0]),float(xlim[1]))
+        self.ylim = (float(ylim[0]),float(ylim[1]))
+        self.callbacks.process('xlim_changed',self)
+        self.callbacks.process('ylim_changed',self)
+        self.canvas.update()
+    def zoom(self,factor,x,y):
+        '''
+        Zooms in by factor, keeping the data position x,y where it is on the screen
+        '''
+        xlim = self.get_xlim()
+        ylim = self.get_ylim()
+        self.set_view([x+(lim-x)/factor for lim in xlim],[y+(lim-y)/factor for lim in ylim])
+    def paint(self,painter):
+        '''
+        Draws the images, only the part of each that is on the screen is scaled
+        '''
+        screen = QRectF(0,0,self.canvas.width(),self.canvas.height())
+        for image in self.images:
+            left,right = image.extent[:2]
+            first,last = image.rows()
+            px0,py0 = self.to_screen(left,first)
+            px1,py1 = self.to_screen(right,last)
+            #the pixmap is turned around when the first row would land below the last, or the columns run backwards
+            flipped = py0 > py1
+            target = QRectF(QPointF(min(px0,px1),min(py0,py1)),QPointF(max(px0,px1),max(py0,py1)))
+            visible = target.intersected(screen)
+            if visible.isEmpty():
+                continue
+            pixmap = image.get_pixmap(flipped)
+            if px0 > px1:
+                pixmap = pixmap.transformed(QTransform().scale(-1,1))
+            fx = pixmap.width()/target.width()
+            fy = pixmap.height()/target.height()
+            source = QRectF((visible.left()-target.left())*fx,(visible.top()-target.top())*fy,visible.width()*fx,visible.height()*fy)
+            painter.drawPixmap(visible,pixmap,source)
+
+class canvas_base():
+    '''
+    What the plain and OpenGL canvases share. It has the parts of a matplotlib FigureCanvas that NTV uses,
+    and pans with a drag of the mouse and zooms with the wheel. A press that moves less than the drag distance
+    of the platform is left as a click, so picking a star does not nudge the view.
+    '''
+    def setup(self):
+        self.ax = self.axes = canvas_axes(self)
+        #NTV reaches the canvas through the figure, as it does in matplotlib
+        self.fig = self
+        self.canvas = self
+        self.events = callback_list()
+        self.dragging = None
+        self.panning = False
+        self.setMouseTracking(True)
+        self.setSizePolicy(QSizePolicy.Expanding,QSizePolicy.Expanding)
+    def mpl_connect(self,name,func):
+        return self.events.connect(name,func)
+    def mpl_disconnect(self,cid):
+        self.events.disconnect(cid)
+    def draw(self):
+        self.update()
+        self.events.process('draw_event',canvas_event('draw_event',self,None,None,None,None))
+    def blit_image(self,image):
+        #there is nothing to blit, the whole canvas is painted from the pixmaps
+        self.update()
+    def format_labels(self):
+        pass
+    def event_at(self,name,event):
+        #makes a canvas_event for a qt mouse event, with the data position only when it is over an image
+        x,y = self.ax.to_data(event.x(),event.y())
+        over = False
+        for image in self.ax.images:
+            left,right,bottom,top = image.extent
+            if min(left,right) <= x <= max(left,right) and min(bottom,top) <= y <= max(bottom,top):
+                over = True
+        if not over:
+            x,y = None,None
+        button = {Qt.LeftButton:1,Qt.MidButton:2,Qt.RightButton:3}.get(event.button())
+        #matplotlib counts y up from the bottom of the canvas
+        return canvas_event(name,self,event.x(),self.height()-event.y(),x,y,button)
+    def paintEvent(self,event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(),Qt.white)
+        self.ax.paint(painter)
+        painter.end()
+    def mousePressEvent(self,event):
+        if event.button() == Qt.LeftButton:
+            self.dragging = (event.x(),event.y(),self.ax.get_xlim(),self.ax.get_ylim())
+            self.panning = False
+        self.events.process('button_press_event',self.event_at('button_press_event',event))
+    def mouseReleaseEvent(self,event):
+        self.dragging = None
+        self.panning = False
+        self.events.process('button_release_event',self.event_at('button_release_event',event))
+    def mouseMoveEvent(self,event):
+        if self.dragging != None:
+            px,py,xlim,ylim = self.dragging
+            if not self.panning:
+                self.panning = (event.pos()-QPoint(px,py)).manhattanLength() >= QApplication.startDragDistance()
+        if self.panning:
+            scale,sx,sy = self.ax.transform()
+            dx = (event.x()-px)/(scale*sx)
+            dy = (event.y()-py)/(scale*sy)
+            self.ax.set_view([lim-dx for lim in xlim],[lim+dy for lim in ylim])
+        self.events.process('motion_notify_event',self.event_at('motion_notify_event',event))
+    def wheelEvent(self,event):
+        x,y = self.ax.to_data(event.x(),event.y())
+        self.ax.zoom(zoom_factor**(event.delta()/120.),x,y)
+        event.accept()
+    def resized(self):
+        #more or less of the data is on screen, which may need rescaling
+        self.ax.callbacks.process('xlim_changed',self.ax)
+        self.ax.callbacks.process('ylim_changed',self.ax)
+
+class image_canvas(canvas_base,QWidget):
+    def __init__(self,parent=None):
+        QWidget.__init__(self,parent)
+        self.setup()
+        #everything is painted over, so qt need not clear it first
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+    def resizeEvent(self,event):
+        QWidget.resizeEvent(self,event)
+        self.resized()
+
+if hasopengl == 1:
+    class gl_canvas(canvas_base,QGLWidget):
+        def __init__(self,parent=None):
+            QGLWidget.__init__(self,parent)
+            self.setup()
+            self.setAutoFillBackground(False)
+        def resizeEvent(self,event):
+            #QGLWidget sets up its viewport here
+            QGLWidget.resizeEvent(self,event)
+            self.resized()
+
+class view_toolbar(QToolBar):
+    '''
+    Home and zoom buttons for a canvas. sethome remembers the current view as the one home goes back to,
+    as update does on the matplotlib toolbar. It is not called update so QWidget.update still repaints it.
+    '''
+    def __init__(self,canvas,parent=None):
+        QToolBar.__init__(self,parent)
+        self.canvas = canvas
+        self.home = None
+        self.addAction(self.style().standardIcon(QStyle.SP_DirHomeIcon),'Home',self.gohome)
+        self.addAction('Zoom In',lambda: self.zoom(zoom_factor))
+        self.addAction('Zoom Out',lambda: self.zoom(1/zoom_factor))
+    def sethome(self):
+        ax = self.canvas.ax
+        self.home = (ax.xlim,ax.ylim)
+    def gohome(self):
+        if self.home != None:
+            self.canvas.ax.set_view(*self.home)
+    def zoom(self,factor):
+        ax = self.canvas.ax
+        ax.zoom(factor,sum(ax.get_xlim())/2.,sum(ax.get_ylim())/2.)
+
+class view_widget(MPL_Widget):
+    '''
+    Takes the place of MPL_Widget for the main view, with a Qt canvas and toolbar. It keeps the focus and
+    arrow key handling of MPL_Widget. With opengl the canvas draws through OpenGL if it is available.
+    '''
+    def __init__(self,parent=None,opengl=False):
+        QWidget.__init__(self,parent)
+        if opengl and hasopengl == 1:
+            self.canvas = gl_canvas()
+        else:
+            self.canvas = image_canvas()
+        self.toolbar = view_toolbar(self.canvas)
+        self.vbox = QVBoxLayout()
+        self.vbox.addWidget(self.canvas)
+        self.vbox.addWidget(self.toolbar)
+        self.setLayout(self.vbox)
+        self.parent = parent
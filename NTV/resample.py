@@ -0,0 +1,103 @@
+#! /usr/bin/env python
+'''
+Resampling of two dimensional images to a different size, by whole or fractional factors, without
+looping over pixels in python. Shrinking combines the block of pixels that falls in each output pixel
+with their mean, sum or max, using reduceat so blocks of any size, including the partial ones at the
+edges, are done in one pass along each axis. Enlarging repeats each pixel, as nearest neighbour.
+'''
+import numpy as np
+
+#How the blocks at the edges are handled when the image is not a whole number of blocks across. partial
+#combines the pixels that are there, trim drops them, so the output only has full blocks.
+edges = ('partial','trim')
+
+#This gives the first index of each block when n pixels are split into blocks factor pixels long. For a
+#fractional factor the blocks are alternately shorter and longer, every pixel ends up in exactly one.
+def block_starts(n,factor,edge='partial'):
+    count = n/factor
+    if edge == 'trim':
+        count = np.floor(count)
+    else:
+        count = np.ceil(count)
+    starts = np.floor(np.arange(max(int(count),1))*factor+1e-9).astype(np.intp)
+    return starts[starts < n]
+
+#This slices data from start to stop by step along axis
+def along(data,axis,start,stop,step=1):
+    index = [slice(None)]*data.ndim
+    index[axis] = slice(start,stop,step)
+    return data[tuple(index)]
+
+#This works out the reduction of data along axis over the blocks starting at starts, which end at stop
+def reduce_axis(data,starts,stop,axis,method):
+    if stop < data.shape[axis]:
+        data = data.take(np.arange(stop),axis=axis)
+    if method == 'max':
+        #fmax passes over NaNs rather than spreading them
+        return np.fmax.reduceat(data,starts,axis=axis)
+    return np.add.reduceat(data,starts,axis=axis,dtype=np.float64)
+
+#This does the same as reduce_axis for blocks a whole factor long, by combining every factor'th slice along
+#axis, which is many times quicker than reduceat for small factors. A short block at stop is combined on its own.
+def reduce_whole(data,factor,stop,axis,method):
+    full = stop-stop%factor
+    if method == 'max':
+        out = along(data,axis,0,full,factor)
+        for i in range(1,factor):
+            out = np.fmax(out,along(data,axis,i,full,factor))
+    else:
+        out = along(data,axis,0,full,factor).astype(np.float64)
+        for i in range(1,factor):
+            out += along(data,axis,i,full,factor)
+    if full < stop:
+        rest = reduce_axis(along(data,axis,full,stop),[0],stop-full,axis,method)
+        out = np.concatenate([out,rest.astype(out.dtype)],axis)
+    return out
+
+#This shrinks data by factor, a number or a (y,x) pair which need not be whole, combining each block of
+#pixels with method, one of mean, sum and max. edge is one of edges. Sums are done in float64 so flux is
+#kept, and the result is float64 unless the data was already floating point.
+def downsample(data,factor,method='mean',edge='partial'):
+    data = np.asarray(data)
+    fy,fx = np.broadcast_arrays(np.asarray(factor,float),[0.,0.])[0]
+    if fy < 1 or fx < 1:
+        raise ValueError('downsample factors have to be at least 1')
+    if method not in ('mean','sum','max'):
+        raise ValueError('Unknown method '+str(method))
+    ny,nx = data.shape
+    ystarts = block_starts(ny,fy,edge)
+    xstarts = block_starts(nx,fx,edge)
+    ystop = ny
+    xstop = nx
+    if edge == 'trim':
+        ystop = min(int(np.floor(len(ystarts)*fy+1e-9)),ny)
+        xstop = min(int(np.floor(len(xstarts)*fx+1e-9)),nx)
+    out = data
+    for axis,factor,starts,stop in ((0,fy,ystarts,ystop),(1,fx,xstarts,xstop)):
+        if factor == int(factor):
+            out = reduce_whole(out,int(factor),stop,axis,method)
+        else:
+            out = reduce_axis(out,starts,stop,axis,method)
+    if method == 'mean':
+        ycount = np.diff(np.append(ystarts,ystop))
+        xcount = np.diff(np.append(xstarts,xstop))
+        out /= np.outer(ycount,xcount)
+    if method != 'max' and data.dtype.kind == 'f':
+        out = out.astype(data.dtype)
+    return out
+
+#This enlarges data by factor, a number or a (y,x) pair which need not be whole, repeating each pixel. When
+#conserve is set each pixel is divided between the ones it is spread over, so the total is kept.
+def upsample(data,factor,conserve=False):
+    data = np.asarray(data)
+    fy,fx = np.broadcast_arrays(np.asarray(factor,float),[0.,0.])[0]
+    if fy < 1 or fx < 1:
+        raise ValueError('upsample factors have to be at least 1')
+    ny,nx = data.shape
+    rows = (np.arange(int(round(ny*fy)))/fy).astype(np.intp)
+    cols = (np.arange(int(round(nx*fx)))/fx).astype(np.intp)
+    out = data.take(rows,axis=0).take(cols,axis=1)
+    if conserve:
+        #each pixel was repeated about fy*fx times, exactly so for whole factors
+        out = out/(fy*fx)
+    return out
@@ -0,0 +1,145 @@
+#! /usr/bin/env python
+'''
+Statistics of an image found in a single pass over it, a block of rows at a time. NTV works these out
+once for each frame and stretch and keeps them, rather than running min and max over the whole frame
+every time it redraws or the mouse moves.
+'''
+import numpy as np
+
+#About how many pixels are looked at in each block, this keeps the temporary arrays small
+block_pixels = 1024**2
+#The number of bins in the histogram, it is kept even so neighbouring bins can be merged in pairs. There are
+#plenty so that percentiles still come out right when a few hot pixels stretch the range far past the rest
+hist_bins = 65536
+#How many clip limits there are for each percent, the clip slider moves in steps of 1/percentile_steps percent
+percentile_steps = 10
+
+class frame_stats():
+    '''
+    The min, max, mean, standard deviation, number of NaNs and a histogram of the finite pixels of an
+    image. Blocks of pixels are put in with add, and the totals are combined as they go, so the pixels
+    are only looked at once. The histogram runs from hist_lo to hist_hi. Its range is only known once
+    everything has been seen, so when a block falls outside of it the range is doubled by merging
+    neighbouring bins, which means it can end up as much as twice as wide as min to max. The values
+    at each percentile are worked out from the cumulative histogram the first time one is asked for.
+    '''
+    def __init__(self):
+        self.count = 0
+        self.nans = 0
+        self.min = None
+        self.max = None
+        self.mean = 0.
+        self.std = 0.
+        #the sum of squared differences from the mean, combined between blocks as in Chan et al.
+        self.m2 = 0.
+        self.hist = None
+        self.hist_lo = None
+        self.hist_hi = None
+        self.levels = None
+        #set when only some of the pixels of the image were looked at
+        self.sampled = False
+    def add(self,block):
+        '''
+        Folds another block of pixels into the statistics
+        '''
+        block = np.asarray(block).ravel()
+        if block.dtype.kind == 'f':
+            finite = np.isfinite(block)
+            self.nans += int(np.isnan(block).sum())
+            if not finite.all():
+                block = block[finite]
+        if len(block) == 0:
+            return
+        bmin = block.min()
+        bmax = block.max()
+        if self.min == None or bmin < self.min:
+            self.min = bmin
+        if self.max == None or bmax > self.max:
+            self.max = bmax
+        n = len(block)
+        bmean = block.mean(dtype=np.float64)
+        bm2 = ((block-bmean)**2).sum(dtype=np.float64)
+        total = self.count+n
+        delta = bmean-self.mean
+        self.mean += delta*n/total
+        self.m2 += bm2+delta**2*self.count*n/total
+        self.count = total
+        self.std = np.sqrt(self.m2/self.count)
+        self.add_hist(block,float(bmin),float(bmax))
+        self.levels = None
+    def add_hist(self,block,bmin,bmax):
+        if self.hist is None:
+            self.hist_lo = bmin
+            self.hist_hi = bmax
+            if self.hist_hi <= self.hist_lo:
+                self.hist_hi = self.hist_lo+1.
+            self.hist = np.zeros(hist_bins,np.int64)
+        half = hist_bins/2
+        while bmin < self.hist_lo:
+            merged = self.hist.reshape(half,2).sum(1)
+            self.hist[:] = 0
+            self.hist[half:] = merged
+            self.hist_lo -= self.hist_hi-self.hist_lo
+        while bmax > self.hist_hi:
+            merged = self.hist.reshape(half,2).sum(1)
+            self.hist[:] = 0
+            self.hist[:half] = merged
+            self.hist_hi += self.hist_hi-self.hist_lo
+        self.hist += np.histogram(block,hist_bins,(self.hist_lo,self.hist_hi))[0]
+    def edges(self):
+        '''
+        The edges of the histogram bins
+        '''
+        return np.linspace(self.hist_lo,self.hist_hi,hist_bins+1)
+    def percentiles(self):
+        '''
+        The pixel values below which 0 to 100 percent of the pixels fall, in steps of 1/percentile_steps percent.
+        They are interpolated within the bins of the cumulative histogram and kept in min to max.
+        '''
+        if self.levels is None:
+            fractions = np.linspace(0,1,100*percentile_steps+1)
+            if self.hist is None:
+                self.levels = np.zeros(len(fractions))+(self.min or 0.)
+            else:
+                cumulative = np.concatenate([[0],np.cumsum(self.hist)])
+                self.levels = np.interp(fractions*cumulative[-1],cumulative,self.edges())
+                np.clip(self.levels,self.min,self.max,out=self.levels)
+                self.levels[0] = self.min
+                self.levels[-1] = self.max
+        return self.levels
+    def percentile(self,percent):
+        '''
+        The value below which percent of the pixels fall, looked up in percentiles
+        '''
+        levels = self.percentiles()
+        return levels[min(max(int(round(percent*percentile_steps)),0),len(levels)-1)]
+    def nbytes(self):
+        #the histogram is nearly all of it, 512KB at 65536 bins
+        size = 0
+        for table in (self.hist,self.levels):
+            if table is not None:
+                size += table.nbytes
+        return size
+    def finish(self):
+        #an image with nothing finite in it still gets numbers that can be drawn with
+        if self.min == None:
+            self.min = 0.
+            self.max = 0.
+        return self
+
+#This finds the statistics of a two dimensional image, which can be anything that can be sliced by rows.
+#When stride is more than one only every stride'th row and column is looked at. progress is called with
+#the fraction done after each block, and if cancelled returns true it stops and returns None.
+def compute(data,stride=1,progress=None,cancelled=None):
+    stats = frame_stats()
+    stats.sampled = stride > 1
+    rows = data.shape[0]
+    cols = max(data.shape[1]/stride,1)
+    step = max(block_pixels/cols/stride,1)*stride
+    for start in range(0,rows,step):
+        if cancelled != None and cancelled():
+            return None
+        if progress != None:
+            progress(start/float(rows))
+        stats.add(data[start:start+step:stride,::stride])
+    return stats.finish()
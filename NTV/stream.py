@@ -0,0 +1,210 @@
+#! /usr/bin/env python
+'''
+Frame at a time access to three dimensional fits data. Instead of holding a whole cube in memory,
+frame_stream reads single frames straight out of the file when they are asked for, and keeps a
+read ahead buffer of the frames around the current one filled from a background thread, so that
+playback in the 3D navigator does not have to wait on the disk.
+'''
+import math
+import threading
+try:
+    from collections import OrderedDict
+except ImportError:
+    OrderedDict = None
+
+import numpy as np
+
+from loader import bitpix_types,data_offset,scaling,convert_block
+
+#How many seconds of playback the read ahead buffer tries to hold, and the most memory it may use
+readahead_seconds = 2.0
+readahead_bytes = 256*1024**2
+#How long the reading thread waits for something to do before it quits, it is started again when needed
+idle_seconds = 5.0
+
+class frame_stream():
+    '''
+    Array like access to the frames of an uncompressed three dimensional image hdu. Indexing it with a
+    frame number returns that frame as an array, read from the buffer if it is there and from disk if
+    not. set_playback tells it which way and how fast frames are being stepped through, which sets how
+    many frames are read ahead. The reading thread only runs while there is reading to do, and close
+    stops it and closes the file, which the image cache does once nothing shows or caches the stream. Frames are handed back as dtype in native
+    byte order, or as pyfits would give them if dtype is None. Frames are read at their offset in the file,
+    so it only works on files that are not compressed as a whole, loader.is_packed tells them apart.
+    '''
+    def __init__(self,path,hdu,dtype=None):
+        header = hdu.header
+        self.path = path
+        self.shape = (header['NAXIS3'],header['NAXIS2'],header['NAXIS1'])
+        self.ndim = 3
+        self.rawtype = np.dtype(bitpix_types[header['BITPIX']])
+        self.bscale,self.bzero,self.blank = scaling(header)
+        if dtype != None:
+            self.dtype = np.dtype(dtype)
+        elif self.bscale != 1 or self.bzero != 0:
+            #scaled data is handed back as floats, as pyfits does
+            if header['BITPIX'] in (32,64,-64):
+                self.dtype = np.dtype('float64')
+            else:
+                self.dtype = np.dtype('float32')
+        else:
+            self.dtype = self.rawtype.newbyteorder('=')
+        self.framebytes = self.shape[1]*self.shape[2]*self.rawtype.itemsize
+        self.offset = data_offset(hdu)
+        self.file = open(path,'rb')
+        #the file handle is shared by the reading thread and whoever asks for frames
+        self.filelock = threading.Lock()
+        if OrderedDict != None:
+            self.buffer = OrderedDict()
+        else:
+            self.buffer = {}
+        self.cond = threading.Condition()
+        self.current = 0
+        self.direction = 0
+        self.ahead = 2
+        self.behind = 2
+        self.thread = None
+        self.closed = False
+        #the bytes held in the buffer, which the image cache counts against its budget
+        self.cachesize = 0
+    def __len__(self):
+        return self.shape[0]
+    def read(self,num):
+        '''
+        Reads a frame from disk, applying BSCALE, BZERO and BLANK
+        '''
+        self.filelock.acquire()
+        try:
+            self.file.seek(self.offset+num*self.framebytes)
+            raw = self.file.read(self.framebytes)
+        finally:
+            self.filelock.release()
+        frame = np.frombuffer(raw,self.rawtype).reshape(self.shape[1:])
+        return convert_block(frame,np.empty(self.shape[1:],self.dtype),self.bscale,self.bzero,self.blank)
+    def __getitem__(self,num):
+        if not isinstance(num,(int,long,np.integer)):
+            raise IndexError('frame_stream only supports getting single frames')
+        if num < 0:
+            num += self.shape[0]
+        if num < 0 or num >= self.shape[0]:
+            raise IndexError('frame %d is out of range' % num)
+        self.cond.acquire()
+        try:
+            frame = self.buffer.get(num)
+            self.current = num
+            self.trim()
+            self.wake()
+        finally:
+            self.cond.release()
+        if frame is None:
+            frame = self.read(num)
+            self.cond.acquire()
+            try:
+                if num not in self.buffer:
+                    self.buffer[num] = frame
+                    self.cachesize += frame.nbytes
+                self.trim()
+            finally:
+                self.cond.release()
+        return frame
+    def set_playback(self,direction,delay=None):
+        '''
+        Sizes the read ahead buffer for playback. direction is 1 or -1 while playing, or 0 when frames are
+        being picked by hand, and delay is the time between frames in seconds.
+        '''
+        maxframes = max(readahead_bytes/max(self.framebytes,1),3)
+        self.cond.acquire()
+        try:
+            self.direction = direction
+            if direction == 0 or delay == None:
+                self.ahead = min(2,maxframes/2)
+                self.behind = self.ahead
+            else:
+                self.ahead = int(min(max(math.ceil(readahead_seconds/max(delay,0.001)),2),maxframes-1))
+                self.behind = 1
+            self.trim()
+            self.wake()
+        finally:
+            self.cond.release()
+    def window(self):
+        '''
+        The frame numbers that should be in the buffer, most wanted first. Playback loops, so the window
+        wraps around the ends of the cube.
+        '''
+        length = self.shape[0]
+        step = self.direction or 1
+        wanted = [self.current]
+        for i in range(1,self.ahead+1):
+            wanted.append((self.current+step*i) % length)
+        for i in range(1,self.behind+1):
+            wanted.append((self.current-step*i) % length)
+        out = []
+        for num in wanted:
+            if num not in out:
+                out.append(num)
+        return out
+    def trim(self):
+        #drop frames that have fallen out of the window, the caller holds cond
+        keep = self.window()
+        for num in list(self.buffer.keys()):
+            if num not in keep:
+                self.cachesize -= self.buffer.pop(num).nbytes
+    def wake(self):
+        #lets the reading thread know the window has moved, starting it if it has quit. the caller holds cond
+        self.cond.notify()
+        if self.thread == None:
+            self.thread = threading.Thread(target=self.readahead)
+            self.thread.setDaemon(True)
+            self.thread.start()
+    def readahead(self):
+        '''
+        Runs on the reading thread, filling the buffer with the frames in the window as the current frame moves
+        '''
+        while True:
+            self.cond.acquire()
+            try:
+                if self.closed:
+                    self.thread = None
+                    return
+                missing = [num for num in self.window() if num not in self.buffer]
+                if len(missing) == 0:
+                    self.cond.wait(idle_seconds)
+                    if self.closed:
+                        self.thread = None
+                        return
+                    missing = [num for num in self.window() if num not in self.buffer]
+                    if len(missing) == 0:
+                        self.thread = None
+                        return
+            finally:
+                self.cond.release()
+            try:
+                frame = self.read(missing[0])
+            except ValueError:
+                #the file was closed while the frame was being read
+                return
+            self.cond.acquire()
+            try:
+                #the window may have moved on while the frame was being read
+                if missing[0] in self.window() and missing[0] not in self.buffer:
+                    self.buffer[missing[0]] = frame
+                    self.cachesize += frame.nbytes
+            finally:
+                self.cond.release()
+    def close(self):
+        '''
+        Stops the reading thread, lets go of the buffer and closes the file. Frames can not be had after this.
+        '''
+        self.cond.acquire()
+        try:
+            self.closed = True
+            self.buffer.clear()
+            self.cachesize = 0
+            self.cond.notify()
+        finally:
+            self.cond.release()
+        self.filelock.acquire()
+        try:
+            self.file.close()
+        finally:
+            self.filelock.release()
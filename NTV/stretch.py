@@ -0,0 +1,256 @@
+#! /usr/bin/env python
+'''
+The stretches NTV can show an image with. Rather than running log, sqrt or asinh over every pixel, a
+stretch is worked out once for each of a fixed number of levels across the frame, and pixels are quantized
+to those levels and looked up in the table. Changing the stretch only makes a new table, which takes a
+millisecond or so whatever the size of the frame.
+
+Nearly all of the levels are spread evenly between percentiles just inside the min and max, so a few hot
+pixels far above the rest do not spread them so thin that the sky falls on a handful of them. The rest are
+spread over each tail out to the min and max, so the brightest pixels, such as the cores of stars, still
+come out different from each other, only more coarsely.
+
+Every stretch keeps the order of the pixel values, so the min, max and percentiles of a stretched frame
+are those of the frame put through the table, and do not need working out again.
+
+Quantizing and looking up are done a block of rows at a time on a pool of threads, each block written
+straight into its part of the output. numpy lets go of the GIL in the ufuncs and the lookup, so the
+blocks run at the same time on as many cores as there are.
+'''
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+from stats import percentile_steps
+
+#The stretches in the order they are offered, and what they are called on the buttons
+names = ('linear','log','sqrt','asinh','histeq','zscale')
+labels = {'linear':'Linear','log':'Log','sqrt':'Sqrt','asinh':'Asinh','histeq':'Hist Eq','zscale':'Zscale'}
+#The settings of the stretches that have them. asinh turns from linear to log around this many standard
+#deviations above the minimum, and zscale uses the contrast IRAF does.
+default_params = {'asinh':(1.,),'zscale':(0.25,)}
+
+#The number of levels pixels are quantized to. The last index of the table is kept for NaNs, so it fits in
+#16 bits, which is one level per count for the usual 16 bit ccd data.
+levels = 65535
+#The percent of pixels in each tail, and how many of the levels each tail gets
+level_clip = 0.1
+tail_levels = 1024
+#About how many pixels zscale looks at
+zscale_samples = 1000
+#About how many pixels are in each block handed to a thread, and how many threads there are, one per core
+#if it is None. Images smaller than a block are done on the calling thread.
+block_pixels = 256*1024
+threads = None
+
+pool = None
+#This returns the thread pool, starting it the first time it is needed
+def thread_pool():
+    global pool
+    if pool == None:
+        pool = ThreadPool(threads or multiprocessing.cpu_count())
+    return pool
+
+#This sets how many threads there are, None for one per core. The pool is started again the next time it is used.
+def set_threads(count):
+    global pool,threads
+    if pool != None:
+        pool.close()
+        pool = None
+    threads = count
+
+#This calls func(start,stop) for blocks of rows covering an image of shape, on the thread pool when there
+#is more than one block
+def run_blocks(func,shape):
+    rows = shape[0]
+    cols = int(np.prod(shape[1:]))
+    step = max(block_pixels/max(cols,1),1)
+    blocks = [(start,min(start+step,rows)) for start in range(0,rows,step)]
+    if len(blocks) < 2:
+        for start,stop in blocks:
+            func(start,stop)
+    else:
+        thread_pool().map(lambda block: func(*block),blocks)
+
+#This picks about count pixels spread evenly over an image, leaving out any that are not finite
+def sample_pixels(data,count=zscale_samples):
+    ny,nx = data.shape
+    stride = max(int(np.sqrt(ny*nx/float(count))),1)
+    sample = np.asarray(data[::stride,::stride]).ravel()
+    return sample[np.isfinite(sample)]
+
+#This is the zscale algorithm of IRAF, which finds display limits around the sky by fitting a line to the
+#sorted sample, rejecting outliers as it goes, and taking the range the line covers over the sample with its
+#slope divided by contrast. It returns the limits z1,z2.
+def zscale(sample,contrast=0.25,krej=2.5,max_iterations=5,max_reject=0.5,min_pixels=5):
+    sample = np.sort(sample)
+    npix = len(sample)
+    if npix == 0:
+        return 0.,0.
+    zmin = sample[0]
+    zmax = sample[-1]
+    center = (npix-1)/2
+    if npix % 2 == 1:
+        median = sample[center]
+    else:
+        median = 0.5*(sample[center]+sample[center+1])
+    minpix = max(min_pixels,int(npix*max_reject))
+    grow = max(1,int(npix*0.01))
+    x = np.arange(npix)
+    good = np.ones(npix,bool)
+    ngood = npix
+    last = npix+1
+    slope = 0.
+    for i in range(max_iterations):
+        if ngood >= last or ngood < minpix:
+            break
+        slope,intercept = np.polyfit(x[good],sample[good],1)
+        flat = sample-(x*slope+intercept)
+        threshold = krej*flat[good].std()
+        bad = np.logical_or(flat < -threshold,flat > threshold)
+        #pixels next to rejected ones go too
+        bad = np.convolve(bad,np.ones(grow),'same') > 0
+        good = np.logical_not(bad)
+        last = ngood
+        ngood = int(good.sum())
+    if ngood < minpix:
+        return zmin,zmax
+    if contrast > 0:
+        slope /= contrast
+    return max(zmin,median-(center-1)*slope),min(zmax,median+(npix-center)*slope)
+
+#This works out the levels of a block of data in work, a float32 array of the same shape, for the knots of
+#level_knots. minimum and maximum pass NaNs through and fmin does not, which is how NaNs end up on the last
+#index without a mask. The pixels in the tails are few, so they are redone on their own after the rest.
+def quantize_block(data,work,knots):
+    mn,lo,hi,mx = knots
+    core = levels-2*tail_levels
+    np.subtract(data,lo,work)
+    work *= (core-1)/(hi-lo)
+    work += tail_levels+0.5
+    below = data < lo
+    if below.any():
+        work[below] = (data[below]-mn)*(tail_levels/((lo-mn) or 1.))+0.5
+    above = data > hi
+    if above.any():
+        work[above] = (data[above]-hi)*(tail_levels/((mx-hi) or 1.))+tail_levels+core-0.5
+    np.minimum(work,levels-1,work)
+    np.maximum(work,0,work)
+    np.fmin(work,levels,work)
+    return work
+
+#This quantizes data to the levels for knots, NaNs get the last index of the table. The levels do not depend
+#on the stretch, so once a frame is quantized any of its stretches can be looked up with them.
+def quantize(data,knots,out=None):
+    if out is None:
+        out = np.empty(data.shape,np.uint16)
+    def block(start,stop):
+        out[start:stop] = quantize_block(data[start:stop],np.empty(out[start:stop].shape,np.float32),knots)
+    run_blocks(block,data.shape)
+    return out
+
+#This gives the knots a frame is quantized with, from its frame_stats, as (min,lo,hi,max). The levels between
+#lo and hi, the level_clip percentiles at each end, are read from the histogram so they cost nothing to find.
+def level_knots(found):
+    mn = float(found.min)
+    mx = float(found.max)
+    lo = float(found.percentile(level_clip))
+    hi = float(found.percentile(100-level_clip))
+    if hi <= lo:
+        hi = lo+1.
+    return min(mn,lo),lo,hi,max(mx,hi)
+
+#This gives the pixel value of each level for knots, tail_levels of them up to lo, the rest evenly up to hi,
+#and tail_levels more out to the max
+def level_values(knots):
+    mn,lo,hi,mx = knots
+    core = levels-2*tail_levels
+    return np.concatenate([np.linspace(mn,lo,tail_levels,endpoint=False),
+                           np.linspace(lo,hi,core),
+                           np.linspace(hi,mx,tail_levels+1)[1:]])
+
+class stretch_table():
+    '''
+    A stretch of a frame as a table of its value at each of the level_values of the frame, from its min to
+    its max, as found in the frame_stats found. sample is an image zscale can take pixels from,
+    such as a zoomed out view of the frame.
+    '''
+    def __init__(self,name,found,params=None,sample=None):
+        self.name = name
+        self.params = params or default_params.get(name,())
+        self.knots = level_knots(found)
+        self.min = self.knots[0]
+        values = level_values(self.knots)
+        self.table = np.empty(levels+1,np.float32)
+        self.table[:levels] = getattr(self,'make_'+name)(values,found,sample)
+        self.table[levels] = np.nan
+    def make_linear(self,values,found,sample):
+        return values
+    def make_log(self,values,found,sample):
+        #the formula of the log stretch before tables, pixels at or below zero are shown as 0.001. It is worked
+        #out at the levels, so pixels are shown at the log of the nearest level rather than their own
+        return np.log(np.where(values <= 0,0.001,values))
+    def make_sqrt(self,values,found,sample):
+        return np.sqrt(values-self.min)
+    def make_asinh(self,values,found,sample):
+        soft = self.params[0]*float(found.std) or 1.
+        return np.arcsinh((values-self.min)/soft)
+    def make_histeq(self,values,found,sample):
+        #each level goes to the fraction of pixels below it, so the colors are spread evenly over the pixels
+        if found.hist is None:
+            return values
+        cumulative = np.concatenate([[0],np.cumsum(found.hist)]).astype(np.float64)
+        return np.interp(values,found.edges(),cumulative/max(cumulative[-1],1))
+    def make_zscale(self,values,found,sample):
+        if sample is None:
+            return values
+        z1,z2 = zscale(sample_pixels(sample),self.params[0])
+        return np.clip(values,z1,z2)
+    def lookup(self,index,out=None):
+        '''
+        The stretched values of pixels quantized to index, as float32, written into out if it is given
+        '''
+        if out is None:
+            out = np.empty(index.shape,np.float32)
+        def block(start,stop):
+            self.table.take(index[start:stop],out=out[start:stop])
+        run_blocks(block,index.shape)
+        return out
+    def apply(self,data,out=None):
+        '''
+        The stretched data as float32, written into out if it is given. Each block of out is used to work out
+        its levels before the lookup fills it, so all that is made besides out is a block of indexes per thread.
+        '''
+        if out is None:
+            out = np.empty(data.shape,np.float32)
+        def block(start,stop):
+            part = out[start:stop]
+            index = quantize_block(data[start:stop],part,self.knots).astype(np.uint16)
+            self.table.take(index,out=part)
+        run_blocks(block,data.shape)
+        return out
+    def value(self,pixel):
+        return self.apply(np.array([pixel]))[0]
+
+class stretched_stats():
+    '''
+    The statistics of a frame after a stretch, worked out from those of the frame. Only the ones used to
+    set the color limits are here, the min, max and percentiles.
+    '''
+    def __init__(self,found,stretch):
+        self.found = found
+        self.stretch = stretch
+        self.min = stretch.value(found.min)
+        self.max = stretch.value(found.max)
+        self.levels = None
+    def nbytes(self):
+        #the table, plus the statistics of the frame it keeps hold of
+        return self.stretch.table.nbytes+self.found.nbytes()
+    def percentiles(self):
+        if self.levels is None:
+            self.levels = self.stretch.apply(self.found.percentiles())
+        return self.levels
+    def percentile(self,percent):
+        levels = self.percentiles()
+        return levels[min(max(int(round(percent*percentile_steps)),0),len(levels)-1)]
@@ -0,0 +1,149 @@
+#! /usr/bin/env python
+'''
+Sums, means and variances of pixels in rectangular boxes. A summed area table holds at each position the
+sum of every pixel above and to the left of it, so the sum of any box is four lookups however big the box,
+and a second table of the squares of the pixels gives the variance the same way. The tables are float64 and
+one pixel bigger than the image each way, so they take four times the memory of a float32 image each, and
+are only made for images up to max_pixels, which keeps them to about 34 MB a table. NaNs and infinities are left out, with a third table counting
+the pixels that are finite if there are any that are not.
+
+Smaller images and ones the tables have not been made for yet are covered by direct_boxes, which gives the
+same answers by summing the pixels in the box.
+'''
+import numpy as np
+
+#The largest image, in pixels, tables are made for
+max_pixels = 2048*2048
+#About how many pixels are added up at a time while the tables are being made
+block_pixels = 4*1024**2
+
+#This turns the count, sum and sum of squares of pixels less offset into their sum, mean and variance
+def moments(count,total,squares,offset):
+    if count <= 0:
+        return 0,0.,np.nan,np.nan
+    mean = total/count
+    return count,total+count*offset,mean+offset,max(squares/count-mean*mean,0.)
+
+class box_statistics():
+    '''
+    The statistics of boxes of an image, from a sums method that gives the count, sum and sum of squares of
+    the pixels less offset in a box. Boxes go from y0 up to but not including y1, and the same for x, the way
+    slices do, and are cut down to the image.
+    '''
+    offset = 0.
+    def clip(self,y0,y1,x0,x1):
+        ny,nx = self.shape
+        return (min(max(int(y0),0),ny),min(max(int(y1),0),ny),
+                min(max(int(x0),0),nx),min(max(int(x1),0),nx))
+    def box_stats(self,y0,y1,x0,x1):
+        '''
+        The number of pixels in the box that are finite, and their sum, mean and variance
+        '''
+        count,total,squares = self.sums(*self.clip(y0,y1,x0,x1))
+        return moments(count,total,squares,self.offset)
+    def box_sum(self,y0,y1,x0,x1):
+        return self.box_stats(y0,y1,x0,x1)[1]
+    def box_mean(self,y0,y1,x0,x1):
+        return self.box_stats(y0,y1,x0,x1)[2]
+    def box_variance(self,y0,y1,x0,x1):
+        return self.box_stats(y0,y1,x0,x1)[3]
+    def ring_stats(self,outer,inner):
+        '''
+        The same as box_stats for the pixels in the box outer, (y0,y1,x0,x1), that are not in the box inner,
+        such as a square annulus around a star for its background
+        '''
+        count,total,squares = self.sums(*self.clip(*outer))
+        incount,intotal,insquares = self.sums(*self.clip(*inner))
+        return moments(count-incount,total-intotal,squares-insquares,self.offset)
+    def around(self,y,x,size):
+        '''
+        The box_stats of the box reaching size pixels either side of the pixel at y,x
+        '''
+        y = int(y+0.5)
+        x = int(x+0.5)
+        return self.box_stats(y-size,y+size+1,x-size,x+size+1)
+
+class direct_boxes(box_statistics):
+    '''
+    Box statistics of image worked out from its pixels each time
+    '''
+    def __init__(self,image):
+        self.image = image
+        self.shape = image.shape
+    def sums(self,y0,y1,x0,x1):
+        box = np.asarray(self.image[y0:y1,x0:x1],np.float64)
+        box = box[np.isfinite(box)]
+        return len(box),box.sum(),np.dot(box,box)
+
+class summed_area(box_statistics):
+    '''
+    Box statistics of image from summed area tables. The tables are made by build, usually off of the gui
+    thread, and anything that can be sliced by rows can be the image.
+    '''
+    def __init__(self,image):
+        self.image = image
+        self.shape = image.shape
+        self.table = None
+        self.squares = None
+        self.counts = None
+    def build(self,progress=None,cancelled=None):
+        '''
+        Makes the tables a block of rows at a time. progress is called with the fraction of the rows done, and
+        if cancelled returns true it stops and returns False.
+        '''
+        ny,nx = self.shape
+        table = np.zeros((ny+1,nx+1),np.float64)
+        squares = np.zeros((ny+1,nx+1),np.float64)
+        counts = None
+        step = max(block_pixels/max(nx,1),1)
+        for start in range(0,ny,step):
+            if cancelled != None and cancelled():
+                return False
+            stop = min(start+step,ny)
+            block = np.array(self.image[start:stop],np.float64)
+            if start == 0:
+                #the sums are of the pixels less about their level, which keeps the variance of boxes far
+                #from the top left from being lost to rounding
+                finite = block[np.isfinite(block)]
+                if len(finite) > 0:
+                    self.offset = float(finite.mean())
+            block -= self.offset
+            #infinities are left out along with NaNs, one would otherwise turn every box below and to the right
+            #of it into inf-inf
+            bad = np.logical_not(np.isfinite(block))
+            if counts is None and bad.any():
+                #every pixel so far was good, so the counts up to here are just the areas
+                counts = np.zeros((ny+1,nx+1),np.int32)
+                counts[:start+1] = np.outer(np.arange(start+1),np.arange(nx+1))
+            block[bad] = 0
+            for out,values in ((table,block),(squares,block*block)):
+                part = out[start+1:stop+1,1:]
+                np.cumsum(values,axis=1,out=part)
+                np.cumsum(part,axis=0,out=part)
+                part += out[start,1:]
+            if counts is not None:
+                part = counts[start+1:stop+1,1:]
+                np.cumsum(np.logical_not(bad),axis=1,out=part)
+                np.cumsum(part,axis=0,out=part)
+                part += counts[start,1:]
+            if progress != None:
+                progress(stop/float(ny))
+        self.table = table
+        self.squares = squares
+        self.counts = counts
+        return True
+    def sums(self,y0,y1,x0,x1):
+        if y1 <= y0 or x1 <= x0:
+            return 0,0.,0.
+        corner = lambda t: t[y1,x1]-t[y0,x1]-t[y1,x0]+t[y0,x0]
+        if self.counts is None:
+            count = (y1-y0)*(x1-x0)
+        else:
+            count = int(corner(self.counts))
+        return count,corner(self.table),corner(self.squares)
+    def nbytes(self):
+        size = 0
+        for t in (self.table,self.squares,self.counts):
+            if t is not None:
+                size += t.nbytes
+        return size
@@ -0,0 +1,245 @@
+#! /usr/bin/env python
+'''
+Support for tile compressed (fpack) images. pyfits decompresses the whole image the first time
+the data of a compressed hdu is touched, which for a large frame is a lot of wasted work when only
+a small area is being looked at. The tiled_image class here only decompresses the tiles a slice
+overlaps, and keeps the decoded tiles around for the next slice.
+'''
+import math
+import threading
+from io import BytesIO
+try:
+    from collections import OrderedDict
+except ImportError:
+    OrderedDict = None
+
+import numpy as np
+import pyfits as pf
+
+#the type pixels of each ZBITPIX decompress to
+zbitpix_types = {8:'uint8',16:'int16',32:'int32',64:'int64',-32:'float32',-64:'float64'}
+
+#This finds the binary table header of a compressed hdu, pyfits has kept it in a couple of places over time
+def table_header(hdu):
+    for name in ('_bintable','_table_header','_header'):
+        head = getattr(hdu,name,None)
+        if name == '_bintable' and head != None:
+            head = head.header
+        if head != None and 'ZIMAGE' in head:
+            return head
+    return None
+
+#This checks if tiled_image can read a compressed hdu, which needs either its binary table header or a pyfits
+#that decompresses sections itself
+def can_tile(hdu):
+    return table_header(hdu) != None or hasattr(hdu,'section')
+
+class tiled_image():
+    '''
+    Array like access to a two dimensional tile compressed image hdu. Slicing it decompresses only
+    the tiles that the slice overlaps, tiles being found by their band, one row of tiles across the
+    image, and their column in it. Decoded tiles are kept in a least recently used cache limited to
+    cachebytes. Only basic indexing with integers and slices is supported, which is all NTV does with
+    an image. If dtype is given decoded tiles are converted to it. Slicing is safe from more than one
+    thread at a time.
+    '''
+    def __init__(self,hdu,cachebytes=256*1024**2,dtype=None):
+        self.hdu = hdu
+        self.workdtype = dtype
+        #astropy and newer pyfits know how to decompress a section of tiles themselves
+        self.hassection = hasattr(hdu,'section')
+        self.header = table_header(hdu)
+        if self.header == None and not self.hassection:
+            raise ValueError('The tile compressed table of this hdu can not be found, see can_tile')
+        if self.header == None:
+            #only the image header is exposed, the tiling is kept on the hdu
+            self.shape = (hdu.header['NAXIS2'],hdu.header['NAXIS1'])
+            tile = getattr(hdu,'tile_shape',None) or (1,self.shape[1])
+            self.tile = (tile[0],tile[1])
+            zbitpix = hdu.header['BITPIX']
+        else:
+            self.shape = (self.header['ZNAXIS2'],self.header['ZNAXIS1'])
+            #by default fpack compresses the image one row at a time
+            self.tile = (self.header.get('ZTILE2',1),self.header.get('ZTILE1',self.shape[1]))
+            zbitpix = self.header['ZBITPIX']
+        self.ndim = 2
+        self.tilesacross = int(math.ceil(self.shape[1]/float(self.tile[1])))
+        self.nbands = int(math.ceil(self.shape[0]/float(self.tile[0])))
+        self.cachebytes = cachebytes
+        self.cachesize = 0
+        self.lock = threading.RLock()
+        if OrderedDict != None:
+            self.cache = OrderedDict()
+        else:
+            self.cache = {}
+        #this gets replaced by the real type the first time anything is decoded
+        self.dtype = np.dtype(zbitpix_types.get(zbitpix,'float32'))
+        if 'BSCALE' in hdu.header or 'BZERO' in hdu.header:
+            self.dtype = np.dtype('float32')
+        if dtype != None:
+            self.dtype = np.dtype(dtype)
+    def __len__(self):
+        return self.shape[0]
+    def __array__(self,dtype=None):
+        data = self[:,:]
+        if dtype != None:
+            data = data.astype(dtype)
+        return data
+    def band_rows(self,band):
+        '''
+        The first and one past the last image row of a band
+        '''
+        return band*self.tile[0],min((band+1)*self.tile[0],self.shape[0])
+    def column_range(self,col):
+        '''
+        The first and one past the last image column of a column of tiles
+        '''
+        return col*self.tile[1],min((col+1)*self.tile[1],self.shape[1])
+    def decode(self,first,last,left,right):
+        '''
+        Decompresses the tiles in bands first up to but not including last and in columns left up to but not
+        including right, and returns them as one array
+        '''
+        y0 = self.band_rows(first)[0]
+        y1 = self.band_rows(last-1)[1]
+        x0 = self.column_range(left)[0]
+        x1 = self.column_range(right-1)[1]
+        if self.hassection:
+            return np.asarray(self.hdu.section[y0:y1,x0:x1])
+        if left > 0 or right < self.tilesacross:
+            #the tiles of part of a band are only next to each other in the table one band at a time
+            return np.concatenate([self.decode_rows(band,band+1,left,right) for band in range(first,last)],0)
+        return self.decode_rows(first,last,left,right)
+    def decode_rows(self,first,last,left,right):
+        #Build a compressed hdu holding only the table rows of these tiles, and let pyfits decompress that.
+        #The dither seed is offset so the tiles are restored with the same seed they were quantized with.
+        y0 = self.band_rows(first)[0]
+        y1 = self.band_rows(last-1)[1]
+        x0 = self.column_range(left)[0]
+        x1 = self.column_range(right-1)[1]
+        start = first*self.tilesacross+left
+        stop = (last-1)*self.tilesacross+right
+        table = self.hdu.compressed_data
+        cols = []
+        for col in table.columns:
+            #a slice of the table loses its heap, so the variable length columns are copied out row by row
+            rows = table.field(col.name)[start:stop]
+            form = col.format
+            if 'P' in form:
+                rows = [np.array(row) for row in rows]
+                form = form.split('(')[0]
+            cols.append(pf.Column(name=col.name,format=form,array=rows))
+        sub = pf.new_table(cols) if hasattr(pf,'new_table') else pf.BinTableHDU.from_columns(cols)
+        for card in self.header.keys():
+            if card[0] == 'Z' or card in ('EXTNAME','BSCALE','BZERO','BLANK'):
+                sub.header[card] = self.header[card]
+        sub.header['ZNAXIS1'] = x1-x0
+        sub.header['ZNAXIS2'] = y1-y0
+        if 'ZDITHER0' in sub.header:
+            sub.header['ZDITHER0'] = sub.header['ZDITHER0']+start
+        buf = BytesIO()
+        pf.HDUList([pf.PrimaryHDU(),sub]).writeto(buf)
+        buf.seek(0)
+        sub = pf.open(buf)
+        data = np.array(sub[1].data)
+        sub.close()
+        return data
+    def tiles(self,bands,columns):
+        '''
+        Returns a dictionary of (band,column) to decoded tile for every tile in the sorted lists of band and column
+        numbers. Missing tiles are decoded together, a rectangle of them for each run of bands and of columns.
+        '''
+        out = {}
+        missing = set()
+        for band in bands:
+            for col in columns:
+                if (band,col) in self.cache:
+                    out[band,col] = self.cache.pop((band,col))
+                    #put it back on the recently used end
+                    self.cache[band,col] = out[band,col]
+                else:
+                    missing.add((band,col))
+        for first,last in runs(sorted(set([band for band,col in missing]))):
+            for left,right in runs(sorted(set([col for band,col in missing if first <= band < last]))):
+                data = self.decode(first,last,left,right)
+                if self.workdtype != None:
+                    data = data.astype(self.workdtype)
+                self.dtype = data.dtype
+                y0 = self.band_rows(first)[0]
+                x0 = self.column_range(left)[0]
+                for band in range(first,last):
+                    ty0,ty1 = self.band_rows(band)
+                    for col in range(left,right):
+                        if (band,col) in out or (band,col) in self.cache:
+                            continue
+                        tx0,tx1 = self.column_range(col)
+                        tile = data[ty0-y0:ty1-y0,tx0-x0:tx1-x0].copy()
+                        self.store((band,col),tile)
+                        if (band,col) in missing:
+                            out[band,col] = tile
+        return out
+    def store(self,key,data):
+        self.cache[key] = data
+        self.cachesize += data.nbytes
+        while self.cachesize > self.cachebytes and len(self.cache) > 1:
+            if OrderedDict != None:
+                old = self.cache.popitem(last=False)[1]
+            else:
+                old = self.cache.pop(self.cache.keys()[0])
+            self.cachesize -= old.nbytes
+    def __getitem__(self,key):
+        #the pyramid is built from another thread while the viewer reads from the gui thread
+        self.lock.acquire()
+        try:
+            return self.getitem(key)
+        finally:
+            self.lock.release()
+    def getitem(self,key):
+        if not isinstance(key,tuple):
+            key = (key,)
+        key = tuple([fix_index(k) for k in key])+(slice(None),)*(2-len(key))
+        rows = np.arange(self.shape[0])[key[0]]
+        cols = np.arange(self.shape[1])[key[1]]
+        rowscalar = np.ndim(rows) == 0
+        colscalar = np.ndim(cols) == 0
+        rows = np.atleast_1d(rows)
+        cols = np.atleast_1d(cols)
+        rowtiles = rows//self.tile[0]
+        coltiles = cols//self.tile[1]
+        bands = sorted(set(rowtiles.tolist()))
+        columns = sorted(set(coltiles.tolist()))
+        decoded = self.tiles(bands,columns)
+        out = np.empty((len(rows),len(cols)),self.dtype)
+        for band in bands:
+            inband = np.nonzero(rowtiles == band)[0]
+            tilerows = rows[inband]-self.band_rows(band)[0]
+            for col in columns:
+                incol = np.nonzero(coltiles == col)[0]
+                tilecols = cols[incol]-self.column_range(col)[0]
+                out[np.ix_(inband,incol)] = decoded[band,col][np.ix_(tilerows,tilecols)]
+        if colscalar:
+            out = out[:,0]
+        if rowscalar:
+            return out[0]
+        return out
+
+#numpy used to accept floats as indices and NTV still indexes with mouse positions, so turn them into ints
+def fix_index(k):
+    if isinstance(k,slice):
+        return slice(to_int(k.start),to_int(k.stop),to_int(k.step))
+    return to_int(k)
+
+def to_int(v):
+    if v == None:
+        return None
+    return int(v)
+
+#This splits a sorted list of ints into runs of consecutive ones, as (first,one past the last) pairs
+def runs(values):
+    out = []
+    for value in values:
+        if out and out[-1][1] == value:
+            out[-1][1] = value+1
+        else:
+            out.append([value,value+1])
+    return [tuple(run) for run in out]
@@ -0,0 +1,105 @@
+#! /usr/bin/env python
+'''
+Timing of the slots that do NTV's work when the view changes, so a sluggish moment can be put down to
+drawing, the mouse readouts, scaling or the fits of the details view. Functions are marked with timed,
+and while the monitor is on it keeps how long their latest calls took and when they were made, along
+with counts of events that were coalesced or dropped. It is turned on from the Image menu, or from the
+start by setting NTV_TIMING in the environment. While it is off a timed function only checks one flag
+before calling straight through.
+'''
+import os
+import time
+import functools
+from collections import deque
+
+#How many of the latest calls of each slot the percentiles and rates are worked out from
+window = 200
+#The percentiles shown for each slot
+shown_percentiles = (50,90,99)
+
+class slot_times():
+    '''
+    The durations and start times of the latest calls of one slot
+    '''
+    def __init__(self):
+        self.took = deque(maxlen=window)
+        self.starts = deque(maxlen=window)
+        self.calls = 0
+    def add(self,start,took):
+        self.took.append(took)
+        self.starts.append(start)
+        self.calls += 1
+    def percentiles(self):
+        '''
+        The durations in seconds at each of shown_percentiles, over the calls kept
+        '''
+        ordered = sorted(self.took)
+        if len(ordered) == 0:
+            return [0. for p in shown_percentiles]
+        return [ordered[min(int(p/100.*len(ordered)),len(ordered)-1)] for p in shown_percentiles]
+    def rate(self,now,span=2.):
+        '''
+        Calls per second over the last span seconds
+        '''
+        recent = [start for start in self.starts if now-start <= span]
+        return len(recent)/span
+
+class latency_monitor():
+    '''
+    The timings of every slot, by name, and the counts of events that were coalesced or dropped
+    '''
+    def __init__(self):
+        self.enabled = os.environ.get('NTV_TIMING','') not in ('','0')
+        self.slots = {}
+        self.counts = {}
+    def reset(self):
+        self.slots = {}
+        self.counts = {}
+    def record(self,name,start,took):
+        if name not in self.slots:
+            self.slots[name] = slot_times()
+        self.slots[name].add(start,took)
+    def count(self,name,number=1):
+        '''
+        Adds to a count, such as the number of events that were coalesced into one, while the monitor is on
+        '''
+        if self.enabled:
+            self.counts[name] = self.counts.get(name,0)+number
+    def report(self):
+        '''
+        A line for each slot with its latency percentiles and rate, and one with the counts
+        '''
+        now = time.time()
+        lines = []
+        for name in sorted(self.slots.keys()):
+            times = self.slots[name]
+            latency = '  '.join(['p%d %6.1f' % (p,took*1000) for p,took in zip(shown_percentiles,times.percentiles())])
+            lines.append('%-11s %s ms  %5.1f/s' % (name,latency,times.rate(now)))
+        if len(self.counts) > 0:
+            lines.append(', '.join(['%s %d' % (name,self.counts[name]) for name in sorted(self.counts.keys())]))
+        return lines
+    def summary(self):
+        '''
+        A short version of report for the status bar, the 90th percentile of each slot
+        '''
+        parts = ['%s %.0f ms' % (name,self.slots[name].percentiles()[1]*1000) for name in sorted(self.slots.keys())]
+        parts.extend(['%s %d' % (name,self.counts[name]) for name in sorted(self.counts.keys())])
+        return ' | '.join(parts)
+
+#The one monitor for the whole program
+monitor = latency_monitor()
+
+#This marks a function as a slot to time under name
+def timed(name):
+    def wrap(func):
+        @functools.wraps(func)
+        def timed_func(*args,**kwargs):
+            if not monitor.enabled:
+                return func(*args,**kwargs)
+            start = time.time()
+            try:
+                return func(*args,**kwargs)
+            finally:
+                monitor.record(name,start,time.time()-start)
+        return timed_func
+    return wrap